@@ -1,27 +1,63 @@
 import subprocess
 import sys
 import os
+import argparse
+from pipeline_metrics import get_run_id, write_run_report
+from job_manifest import mark_stage_finished
+
+parser = argparse.ArgumentParser(description="Run the download, transcribe and summarize stages in order.")
+parser.add_argument('--profile', action='store_true', help="Profile every stage (passed through to each script).")
+parser.add_argument('--workers', type=int, help="Parallel workers for the download and transcription stages (sets PIPELINE_WORKERS).")
+parser.add_argument('--stream', action='store_true', help="Summarize while transcription is still running (3_summarize_with_openai.py --follow).")
+args = parser.parse_args()
+stage_args = ['--profile'] if args.profile else []
+if args.workers:
+    os.environ['PIPELINE_WORKERS'] = str(args.workers)
+
+# Share one run id with every stage so their metrics land in the same metrics/<run_id>/ folder
+run_id = get_run_id()
+print(f"Pipeline run id: {run_id}")
 
 # Define a list of scripts you want to run in order
 scripts_to_run = ['1_download_audio.py', '2_transcribe_audio.py', '3_summarize_with_openai.py']
 
 # Iterate over the script list to run them one by one
 for script in scripts_to_run:
+    if args.stream and script == '3_summarize_with_openai.py':
+        break  # Already ran alongside the transcription stage
+
     print(f"Running {script}...\n")
     
     # Ensure the working directory is the same as this script's directory
     script_path = os.path.join(os.path.dirname(__file__), script)
 
     # Starting the process, directing standard output and standard error directly to the console
-    process = subprocess.Popen(['python', script_path], stdout=sys.stdout, stderr=sys.stderr)
+    process = subprocess.Popen(['python', script_path] + stage_args, stdout=sys.stdout, stderr=sys.stderr)
+
+    # With --stream, start the summarizer in follow mode next to the transcription stage
+    follower = None
+    if args.stream and script == '2_transcribe_audio.py':
+        print("Running 3_summarize_with_openai.py --follow alongside it...\n")
+        summarize_path = os.path.join(os.path.dirname(__file__), '3_summarize_with_openai.py')
+        follower = subprocess.Popen(['python', summarize_path, '--follow'] + stage_args, stdout=sys.stdout, stderr=sys.stderr)
 
     # Wait for the process to complete
     process.wait()
 
+    if follower is not None:
+        # Let the follower finish even if the transcription stage died before marking itself done
+        mark_stage_finished('2_transcribe_audio')
+        follower.wait()
+        if follower.returncode != 0:
+            print(f"\nFailed to run 3_summarize_with_openai.py --follow with error code: {follower.returncode}\n")
+
     # Check if the process exited with an error
     if process.returncode == 100:
         print(f"\n{script} reported no submissions to process. Exiting gracefully.\n")
         break
     elif process.returncode != 0:
         print(f"\nFailed to run {script} with error code: {process.returncode}\n")
-        break
\ No newline at end of file
+        break
+
+# Merge the per-stage metrics into a single run report
+write_run_report(run_id)
@@ -1,21 +1,33 @@
 # Existing imports
+# Heavy third-party modules (requests, yt_dlp and the transcript API) are
+# imported inside the functions that use them so that starting
+# this script stays cheap when there is nothing to process.
 import os
 import time
 import logging
-import requests
-from os import environ, path
-from urllib.parse import urlparse, parse_qs, unquote
-from dotenv import load_dotenv
-from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled, NoTranscriptAvailable
-import psycopg2
-import psycopg2.extras
-import yt_dlp as youtube_dl
+from urllib.parse import unquote
 import re
 import shutil  # Add this import
 import sys  # Add this import
-from google.cloud import secretmanager  # Add this import
-
-GCP_PROJECT_ID = "kumori-404602"
+import datetime
+import threading
+import argparse
+
+# Database access and credential resolution live in audio_postgres_utils, which
+# shares the cached secret provider in google_secret_utils with the other stages.
+from audio_postgres_utils import fetch_audio_submissions, insert_child_submissions, update_completion_boolean_with_pk_id
+from job_manifest import update_manifest, load_manifest, clear_jobs_folder
+from pipeline_metrics import inc, observe, timer, export_stage_metrics
+from pipeline_tracing import span, export_spans
+from pipeline_profiling import profile_run, profiling_requested
+from work_scheduler import run_scheduled, estimate_duration_seconds
+from workspace_manager import reserve, files_bytes, estimate_media_bytes, is_disk_full_error, WorkspaceFull, WORKSPACE_WAIT_SECONDS
+from youtube_utils import get_video_id, is_youtube_collection_url, expand_youtube_collection, get_cached_video_metadata, record_caption_availability
+from transcript_store import find_processed_source_ids
+from concurrent.futures import ThreadPoolExecutor
+
+# Histogram buckets for download throughput, from 64 KB/s up to 100 MB/s.
+THROUGHPUT_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 32e6, 64e6, 100e6)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,90 +35,6 @@ logging.basicConfig(
 )
 
 
-def load_env_file():
-    dotenv_path = path.join(path.dirname(__file__), '.env')
-    if path.exists(dotenv_path):
-        load_dotenv(dotenv_path)
-        return True
-    return False
-
-def get_postgres_credentials(gcp_project_id=GCP_PROJECT_ID):
-    try:
-        if load_env_file():
-            return {
-                'host': environ.get('2024jan10_POSTGRES_HOST'),
-                'dbname': environ.get('2024jan10_POSTGRES_DBNAME'),
-                'user': environ.get('2024jan10_POSTGRES_USERNAME'),
-                'password': environ.get('2024jan10_POSTGRES_PASSWORD'),
-                'connection_name': environ.get('2024jan10_POSTGRES_CONNECTION')
-            }
-        else:
-            raise Exception('.env file not found or not loaded')
-    except Exception as env_error:
-        logging.warning(f"Failed to load credentials from .env file: {env_error}")
-        logging.info("Attempting to load credentials from Google Cloud Secret Manager")
-        return {
-            'host': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_IP'),
-            'dbname': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_DB_NAME'),
-            'user': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_USERNAME'),
-            'password': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_PASSWORD'),
-            'connection_name': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_CONNECTION_NAME'),
-        }
-
-def get_secret_version(project_id, secret_id, version_id="latest"):
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode('UTF-8')
-
-def get_db_connection(gcp_project_id=GCP_PROJECT_ID):
-    db_credentials = get_postgres_credentials(gcp_project_id)
-    is_gcp = environ.get('GAE_ENV', '').startswith('standard')
-    
-    if is_gcp:
-        db_socket_dir = environ.get("DB_SOCKET_DIR", "/cloudsql")
-        cloud_sql_connection_name = db_credentials['connection_name']
-        host = f"{db_socket_dir}/{cloud_sql_connection_name}"
-    else:
-        host = db_credentials['host']
-    
-    try:
-        conn = psycopg2.connect(
-            dbname=db_credentials['dbname'],
-            user=db_credentials['user'],
-            password=db_credentials['password'],
-            host=host
-        )
-        logging.info("Database connection established.")
-        return conn
-    except Exception as e:
-        logging.error(f"Failed to connect to the database: {e}")
-        return None
-
-def fetch_audio_submissions(gcp_project_id=GCP_PROJECT_ID):
-    conn = get_db_connection(gcp_project_id)
-    if conn is not None:
-        try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                query = """
-                SELECT pk_id, audio_url, date_submitted, format, ingest_point, 
-                       email_address, last_updated, completion_boolean, comments, file_size
-                FROM prod_user_audio_submissions
-                WHERE completion_boolean = False
-                """
-                cur.execute(query)
-                records = cur.fetchall()
-                return records
-        except Exception as e:
-            logging.error(f"Error fetching audio submissions: {e}")
-        finally:
-            conn.close()
-            logging.info("Database connection closed.")
-    else:
-        logging.error("Failed to create a database connection.")
-        return []
-
-
 # Set a variable for the downloaded files folder
 DOWNLOADED_FILE_FOLDER_NAME = "download"
 
@@ -118,6 +46,11 @@ deleted_files = []
 overwritten_files = []
 download_failures = []
 successful_downloads = []
+deferred_downloads = []
+
+# Set once a download gave up waiting for workspace space. Nothing in this stage frees space,
+# so the remaining submissions are deferred right away instead of each waiting out the timeout.
+workspace_exhausted = threading.Event()
 
 def sanitize_filename(filename):
     """Sanitizes filenames to ensure they are valid and uniform."""
@@ -153,24 +86,12 @@ def download_complete(d):
         print(f"\nDownload Complete. File saved to {d['filename']}")
         successful_downloads.append(d['filename'])
 
-def get_video_id(video_url):
-    parsed_url = urlparse(video_url)
-    if parsed_url.hostname == 'youtu.be':
-        return parsed_url.path[1:]
-    if parsed_url.hostname in ('www.youtube.com', 'youtube.com'):
-        if parsed_url.path == '/watch':
-            return parse_qs(parsed_url.query).get('v', [None])[0]
-        if '/embed/' in parsed_url.path:
-            return parsed_url.path.split('/')[2]
-        if parsed_url.path[:3] == '/v/':
-            return parsed_url.path.split('/')[2]
-    return None
-
 def fetch_and_save_youtube_transcript(url, output_filename):
+    from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled, NoTranscriptAvailable
     video_id = get_video_id(url)
     if not video_id:
         print("Failed to extract video ID. No transcript will be saved.")
-        return
+        return None
     
     try:
         transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['en', 'en-US'])
@@ -182,13 +103,25 @@ def fetch_and_save_youtube_transcript(url, output_filename):
             transcript_file.write(transcribed_text)
             
         print(f"Transcript saved successfully to {transcript_file_path}")
+        return transcript_file_path
         
     except (TranscriptsDisabled, NoTranscriptFound, NoTranscriptAvailable) as e:
         print(f"Transcript not available: {e}")
     except Exception as e:
         print(f"Failed to fetch transcript: {e}")
+    return None
+
+# Function: Record size, duration and throughput of a finished download.
+def record_download_metrics(ingest_point, download_path, elapsed_seconds):
+    downloaded_bytes = os.path.getsize(download_path) if os.path.exists(download_path) else 0
+    inc('download_bytes_total', downloaded_bytes, help="Bytes downloaded.", ingest_point=ingest_point)
+    observe('download_seconds', elapsed_seconds, help="Wall time per download.", ingest_point=ingest_point)
+    if elapsed_seconds > 0:
+        observe('download_throughput_bytes_per_second', downloaded_bytes / elapsed_seconds, buckets=THROUGHPUT_BUCKETS,
+                help="Download throughput per file.", ingest_point=ingest_point)
 
 def download_with_ytdlp(url, pk_id, output_filename):
+    import yt_dlp as youtube_dl
     ydl_opts = {
         'format': 'best[ext=mp4]',  # Ensure MP4 format
         'noplaylist': True,
@@ -196,41 +129,65 @@ def download_with_ytdlp(url, pk_id, output_filename):
         'quiet': False,
         'progress_hooks': [download_complete]
     }
-    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+    download_start = time.perf_counter()
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl, span('ytdlp.download', url=url):
         ydl.download([url])
+    record_download_metrics('youtube', ydl_opts['outtmpl'], time.perf_counter() - download_start)
+    return ydl_opts['outtmpl']
 
 def download_and_convert_youtube(url, pk_id):
+    import yt_dlp as youtube_dl
     try:
         video_id = get_video_id(url)
         if not video_id:
             print(f"Failed to extract video ID for URL: {url}")
             download_failures.append(url)
+            update_manifest(pk_id, status='download_failed', error="Failed to extract video ID")
             return
 
-        # Fetch video details using yt-dlp to get the title
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-        }
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            video_title = sanitize_filename(info_dict.get('title', f"video_{pk_id}"))
+        # Videos listed by a playlist/channel expansion already have their title and duration cached
+        info_dict = get_cached_video_metadata(video_id)
+        if info_dict is None:
+            # Fetch video details using yt-dlp to get the title
+            ydl_opts = {
+                'quiet': True,
+                'skip_download': True,
+            }
+            with youtube_dl.YoutubeDL(ydl_opts) as ydl, timer('ytdlp_extract_seconds', help="yt-dlp metadata extraction time."), span('ytdlp.extract_info', url=url):
+                info_dict = ydl.extract_info(url, download=False)
+        video_title = sanitize_filename(info_dict.get('title') or f"video_{pk_id}")
 
         output_filename = f"{video_title}_pkid_{pk_id}"
         
         # Download video and fetch transcript
         try:
-            download_with_ytdlp(url, pk_id, output_filename)
-            fetch_and_save_youtube_transcript(url, output_filename)
+            media_path = download_with_ytdlp(url, pk_id, output_filename)
+            with span('youtube.fetch_captions', video_id=video_id) as captions_span:
+                captions_path = fetch_and_save_youtube_transcript(url, output_filename)
+                captions_span.set_attribute('captions_found', captions_path is not None)
+            record_caption_availability(video_id, captions_path is not None)
+            update_manifest(
+                pk_id,
+                artifacts={'media': media_path, 'captions': captions_path},
+                status='downloaded',
+                title=info_dict.get('title', f"video_{pk_id}"),
+                video_id=video_id,
+                source_duration_seconds=info_dict.get('duration'),
+                media_bytes=os.path.getsize(media_path) if os.path.exists(media_path) else None,
+                downloaded_at=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            )
         except Exception as e:
             print(f"Failed to download {url} with yt-dlp. Error: {e}")
             download_failures.append(url)
+            update_manifest(pk_id, status='download_failed', error=str(e))
 
     except Exception as e:
         print(f"Failed to download YouTube URL {url}. Error: {e}")
         download_failures.append(url)
+        update_manifest(pk_id, status='download_failed', error=str(e))
 
 def download_and_convert_google_drive(url, pk_id):
+    import requests
     final_url = url
     try:
         if "drive.google.com" in url:
@@ -238,10 +195,13 @@ def download_and_convert_google_drive(url, pk_id):
             if file_id_match:
                 file_id = file_id_match.group(1)
                 final_url = f"https://drive.google.com/uc?id={file_id}&export=download"
-        response = requests.get(final_url, stream=True)
+        download_start = time.perf_counter()
+        with span('gdrive.request', url=final_url):
+            response = requests.get(final_url, stream=True)
         if b'accounts.google.com' in response.content[0:1000]:
             print("The file isn't shared properly or it's not available for download.")
             download_failures.append(final_url)
+            update_manifest(pk_id, status='download_failed', error="File is not shared or not available for download")
             return
 
         if response.status_code == 200:
@@ -259,59 +219,207 @@ def download_and_convert_google_drive(url, pk_id):
             
             with open(download_path, 'wb') as f:
                 f.write(response.content)
+            record_download_metrics('gdrive', download_path, time.perf_counter() - download_start)
             print(f"\nDownloaded Google Drive file to {download_path}")
             successful_downloads.append(download_path)
+            update_manifest(
+                pk_id,
+                artifacts={'media': download_path},
+                status='downloaded',
+                title=os.path.splitext(filename)[0],
+                media_bytes=os.path.getsize(download_path),
+                downloaded_at=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            )
+        else:
+            update_manifest(pk_id, status='download_failed', error=f"HTTP {response.status_code}")
 
     except Exception as e:
         print(f"Failed to process Google Drive URL {final_url}. Error: {e}")
         download_failures.append(final_url)
+        update_manifest(pk_id, status='download_failed', error=str(e))
     finally:
         print(f"\nFinished processing: {url} as gdrive with pk_id = {pk_id}")
 
-def download_and_convert(url, ingest_point, pk_id):
+# Function: List the files a download of pk_id has written so far (media, captions, yt-dlp .part files).
+def download_paths(pk_id):
+    pattern = re.compile(rf"_pkid_{pk_id}\.")
+    if not os.path.exists(DOWNLOADED_FILE_FOLDER_NAME):
+        return []
+    return [
+        os.path.join(DOWNLOADED_FILE_FOLDER_NAME, filename) for filename in os.listdir(DOWNLOADED_FILE_FOLDER_NAME)
+        if pattern.search(filename) and os.path.isfile(os.path.join(DOWNLOADED_FILE_FOLDER_NAME, filename))
+    ]
+
+# Function: Delete what a download interrupted by a full disk left behind (e.g. yt-dlp .part files).
+def remove_partial_download(pk_id):
+    for file_path in download_paths(pk_id):
+        os.remove(file_path)
+
+def download_and_convert(url, ingest_point, pk_id, email_address=None, expected_bytes=None):
     ensure_download_folder_exists()
     print(f"\nProcessing: {url} as {ingest_point} with pk_id = {pk_id}")
-    if ingest_point == 'youtube':
-        download_and_convert_youtube(url, pk_id)
-    elif ingest_point == 'gdrive':
-        download_and_convert_google_drive(url, pk_id)
+    update_manifest(pk_id, source_url=url, ingest_point=ingest_point, email_address=email_address, status='downloading')
+    with span('download_and_convert', pk_id=pk_id, url=url, ingest_point=ingest_point) as download_span:
+        try:
+            # Wait for room under the workspace quota instead of running the disk full.
+            # The files written so far count toward the reservation, not on top of it.
+            with reserve(expected_bytes or estimate_media_bytes(), label=f"pk_id {pk_id}",
+                         timeout=0 if workspace_exhausted.is_set() else WORKSPACE_WAIT_SECONDS,
+                         written_bytes=lambda: files_bytes(download_paths(pk_id))):
+                if ingest_point == 'youtube':
+                    download_and_convert_youtube(url, pk_id)
+                elif ingest_point == 'gdrive':
+                    download_and_convert_google_drive(url, pk_id)
+        except WorkspaceFull as e:
+            workspace_exhausted.set()
+            print(f"Deferring pk_id {pk_id} to the next run: {e}")
+            update_manifest(pk_id, status='deferred', error=str(e))
+        manifest = load_manifest(pk_id)
+        if manifest.get('status') == 'download_failed' and is_disk_full_error(manifest.get('error', '')):
+            print(f"Disk full while downloading pk_id {pk_id}; deferring it to the next run")
+            remove_partial_download(pk_id)
+            manifest = update_manifest(pk_id, status='deferred')
+        # Read the outcome from this job's manifest; the shared failure list is written by all workers.
+        # Deferred submissions stay pending in the database, so the next run picks them up again.
+        result = {'downloaded': 'success', 'deferred': 'deferred'}.get(manifest.get('status'), 'failure')
+        if result == 'deferred':
+            deferred_downloads.append(pk_id)
+        download_span.set_attribute('result', result)
+    inc('downloads_total', help="Submissions processed by the download stage.", ingest_point=ingest_point, result=result)
+
+# Function: Download one submission row (used as the scheduler's worker function).
+def process_submission(submission):
+    url = submission['audio_url']
+    ingest_point = submission['ingest_point']
+    pk_id = submission['pk_id']
+    print(f"Processing Submission: URL={url}, Ingest Point={ingest_point}, PK_ID={pk_id}")
+    video_id = get_video_id(url) if ingest_point == 'youtube' else None
+    cached_metadata = get_cached_video_metadata(video_id) if video_id else None
+    expected_bytes = estimate_media_bytes(submission['file_size'], (cached_metadata or {}).get('duration'))
+    download_and_convert(url, ingest_point, pk_id, submission['email_address'], expected_bytes)
+
+# Function: Replace playlist and channel submissions with one child submission per new video.
+def expand_collection_submissions(submissions, workers=1):
+    """
+    Collections are listed in parallel with flat extraction. Videos the same user already has a stored
+    transcript for, or that another of the user's submissions in this batch covers, are skipped. Each remaining
+    video gets its own submission row (same user and request as the parent); the parent row is marked complete.
+    Videos other users already had transcribed still get a row, and stage 2 reuses the stored transcript.
+    Returns (submissions to download, {pk_id: known duration in seconds}).
+    """
+    collections = [s for s in submissions if s['ingest_point'] == 'youtube' and is_youtube_collection_url(s['audio_url'])]
+    if not collections:
+        return submissions, {}
+    collection_pk_ids = {s['pk_id'] for s in collections}
+    jobs = [s for s in submissions if s['pk_id'] not in collection_pk_ids]
+    # (email_address, video_id) pairs already covered for each user
+    seen_videos = {(s['email_address'], get_video_id(s['audio_url'])) for s in jobs if s['ingest_point'] == 'youtube'}
+
+    def expand(submission):
+        try:
+            with span('youtube.expand_collection', pk_id=submission['pk_id'], url=submission['audio_url']):
+                return submission, expand_youtube_collection(submission['audio_url'])
+        except Exception as e:
+            return submission, e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        expansions = list(executor.map(expand, collections))
+
+    video_ids_by_user = {}
+    for parent, entries in expansions:
+        if isinstance(entries, list):
+            video_ids_by_user.setdefault(parent['email_address'], set()).update(entry['video_id'] for entry in entries)
+    for email_address, video_ids in video_ids_by_user.items():
+        seen_videos |= {(email_address, video_id) for video_id in find_processed_source_ids(video_ids, email_address=email_address)}
+
+    known_durations = {}
+    for parent, entries in expansions:
+        parent_pk_id = parent['pk_id']
+        update_manifest(parent_pk_id, source_url=parent['audio_url'], ingest_point='youtube', email_address=parent['email_address'])
+        if isinstance(entries, Exception):
+            print(f"Failed to expand {parent['audio_url']}: {entries}")
+            download_failures.append(parent['audio_url'])
+            update_manifest(parent_pk_id, status='download_failed', error=str(entries))
+            continue
+
+        new_entries, skipped_video_ids = [], []
+        for entry in entries:
+            if (parent['email_address'], entry['video_id']) in seen_videos:
+                skipped_video_ids.append(entry['video_id'])
+            else:
+                seen_videos.add((parent['email_address'], entry['video_id']))
+                new_entries.append(entry)
+        children = insert_child_submissions(
+            parent_pk_id=parent_pk_id,
+            children=[(entry['url'], f"Expanded from pk_id {parent_pk_id}: {parent['audio_url']}") for entry in new_entries],
+        )
+        for child, entry in zip(children, new_entries):
+            known_durations[child['pk_id']] = entry['duration']
+        jobs.extend(children)
+
+        print(f"Expanded {parent['audio_url']} into {len(children)} new video(s); skipped {len(skipped_video_ids)} the user already has.")
+        inc('collection_videos_total', len(children), help="Videos fanned out from playlist and channel submissions.", result='queued')
+        inc('collection_videos_total', len(skipped_video_ids), help="Videos fanned out from playlist and channel submissions.", result='duplicate')
+        update_manifest(parent_pk_id, status='expanded', child_pk_ids=[child['pk_id'] for child in children], skipped_video_ids=skipped_video_ids)
+        # If some rows could not be created the parent stays pending; its existing children are skipped next time
+        if len(children) == len(new_entries):
+            update_completion_boolean_with_pk_id(pk_id=parent_pk_id)
+    return jobs, known_durations
 
 if __name__ == "__main__":
-    start_time = time.time()
-
-    # Count and display the number of video and transcript files before deletion
-    if os.path.exists(DOWNLOADED_FILE_FOLDER_NAME):
-        video_files_count = len([f for f in os.listdir(DOWNLOADED_FILE_FOLDER_NAME) if os.path.isfile(os.path.join(DOWNLOADED_FILE_FOLDER_NAME, f))])
-        transcript_files_count = len([f for f in os.listdir(transcripts_folder) if os.path.isfile(os.path.join(transcripts_folder, f))]) if os.path.exists(transcripts_folder) else 0
-        print(f"Existing video files: {video_files_count}")
-        print(f"Existing transcript files: {transcript_files_count}")
+    parser = argparse.ArgumentParser(description="Download audio for pending submissions.")
+    parser.add_argument('--profile', action='store_true', help="Write cProfile, tracemalloc and stack samples to profiles/<run_id>/.")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PIPELINE_WORKERS', 1)), help="Parallel downloads.")
+    args = parser.parse_args()
+
+    with profile_run('1_download_audio', profiling_requested(args.profile)):
+        start_time = time.time()
+
+        # Count and display the number of video and transcript files before deletion
+        if os.path.exists(DOWNLOADED_FILE_FOLDER_NAME):
+            video_files_count = len([f for f in os.listdir(DOWNLOADED_FILE_FOLDER_NAME) if os.path.isfile(os.path.join(DOWNLOADED_FILE_FOLDER_NAME, f))])
+            transcript_files_count = len([f for f in os.listdir(transcripts_folder) if os.path.isfile(os.path.join(transcripts_folder, f))]) if os.path.exists(transcripts_folder) else 0
+            print(f"Existing video files: {video_files_count}")
+            print(f"Existing transcript files: {transcript_files_count}")
+
+            # Clear the download folder
+            clear_download_folder()
+
+        # Ensure the download folder exists after deletion
+        ensure_download_folder_exists()
+
+        # Start from an empty set of job manifests for this run
+        clear_jobs_folder()
+
+        # Check if it has anything to process
+        submissions = fetch_audio_submissions() or []
+        print(f"Fetched {len(submissions)} submissions")
+        if not submissions:
+            print("No audio submissions to process. Exiting.")
+            sys.exit(100)
+
+        # Playlist and channel submissions become one child submission per video
+        submissions, known_durations = expand_collection_submissions(submissions, args.workers)
+
+        # Largest files first (by known duration or file_size), interleaved fairly across users, spread over the workers
+        run_scheduled(
+            submissions,
+            process_submission,
+            duration_fn=lambda submission: estimate_duration_seconds(known_durations.get(submission['pk_id']), submission['file_size']),
+            workers=args.workers,
+            owner_fn=lambda submission: submission['email_address'],
+        )
 
-        # Clear the download folder
-        clear_download_folder()
+        print("\n=== Final Summary ===")
+        print(f"Deleted Files: {deleted_files}")
+        print(f"Overwritten Files: {overwritten_files}")
+        print(f"Download Failures: {download_failures}")
+        print(f"Successful Downloads: {len(successful_downloads)}")
+        print(f"Failed Downloads: {len(download_failures)}")
+        print(f"Deferred Downloads (workspace full): {len(deferred_downloads)}")
 
-    # Ensure the download folder exists after deletion
-    ensure_download_folder_exists()
+        end_time = time.time()
+        print(f"\nTotal Time Taken: {end_time - start_time:.2f} seconds")
 
-    # Check if it has anything to process
-    submissions = fetch_audio_submissions()
-    print(f"Fetched {len(submissions)} submissions")
-    if not submissions:
-        print("No audio submissions to process. Exiting.")
-        sys.exit(100)
-
-    for submission in submissions:
-        url = submission['audio_url']
-        ingest_point = submission['ingest_point']
-        pk_id = submission['pk_id']
-        print(f"Processing Submission: URL={url}, Ingest Point={ingest_point}, PK_ID={pk_id}")
-        download_and_convert(url, ingest_point, pk_id)
-
-    print("\n=== Final Summary ===")
-    print(f"Deleted Files: {deleted_files}")
-    print(f"Overwritten Files: {overwritten_files}")
-    print(f"Download Failures: {download_failures}")
-    print(f"Successful Downloads: {len(successful_downloads)}")
-    print(f"Failed Downloads: {len(download_failures)}")
-
-    end_time = time.time()
-    print(f"\nTotal Time Taken: {end_time - start_time:.2f} seconds")
\ No newline at end of file
+        export_stage_metrics('1_download_audio')
+        export_spans('1_download_audio')
\ No newline at end of file
@@ -1,11 +1,24 @@
-import speech_recognition as sr
-from pydub import AudioSegment
 import os
 import re
 import time
 import csv
 import datetime
 import shutil  # Add this import
+import argparse
+import threading
+from functools import lru_cache
+from job_manifest import list_manifests, update_manifest, get_artifact, mark_stage_finished, clear_stage_finished
+from pipeline_metrics import inc, observe, timer, export_stage_metrics
+from pipeline_tracing import span, export_spans
+from pipeline_profiling import profile_run, profiling_requested, profiled, profile_section
+from work_scheduler import run_scheduled, estimate_duration_seconds
+from pcm_cache import decode_to_pcm, cache_path
+from workspace_manager import WorkspaceFull, release_media
+from transcript_store import record_transcript_log
+from audio_fingerprint import pcm_samples, compute_fingerprint, find_duplicate, register_recording, load_transcript_chunks
+
+# speech_recognition and pydub are imported on first use so that importing this
+# module (and starting the script with nothing to do) stays cheap.
 
 # Set chunk length in seconds.
 GLOBAL_CHUNK_LENGTH = 30
@@ -14,18 +27,44 @@ GLOBAL_CHUNK_LENGTH = 30
 input_dir = "download"
 transcripts_folder = os.path.join("download", "transcripts")
 chunking_log_dir = "transcribe"
-os.makedirs(chunking_log_dir, exist_ok=True)
 
 # Generate timestamp for the current run.
 run_timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
 
 # Supported audio formats.
 supported_formats = [".ogg", ".oga", ".mp4", ".mp3", ".wav"]
-recognizer = sr.Recognizer()
+
+# Audio processed so far across all files, shared by the worker threads for the ETA.
+_progress_lock = threading.Lock()
+_processed_duration_ms = 0
+
+# Function: Add processed audio to the shared progress and return the new total.
+def record_progress(duration_ms):
+    global _processed_duration_ms
+    with _progress_lock:
+        _processed_duration_ms += duration_ms
+        return _processed_duration_ms
+
+# Function: Create the shared speech recognizer on first use.
+@lru_cache(maxsize=None)
+def get_recognizer():
+    import speech_recognition as sr
+    return sr.Recognizer()
 
 # Function: Get audio duration in milliseconds.
-def get_audio_duration_ms(input_filepath):
-    return len(AudioSegment.from_file(input_filepath))
+def get_audio_duration_ms(input_filepath, manifest=None):
+    """Decodes the file into the PCM cache (reused later by process_audio_file). Returns 0 if it cannot be decoded."""
+    try:
+        with timer('audio_probe_seconds', help="Time to decode a file to measure its duration."):
+            # Don't wait for space here: near the quota, leave the decode to the worker.
+            with decode_to_pcm(input_filepath, reserve_timeout=0) as audio:
+                return audio.duration_ms
+    except WorkspaceFull:
+        known_seconds = (manifest or {}).get('source_duration_seconds')
+        return int(estimate_duration_seconds(known_seconds, os.path.getsize(input_filepath)) * 1000)
+    except Exception as e:
+        print(f"Error probing {input_filepath}: {e}")
+        return 0
 
 # Function: Convert seconds to a time string.
 def time_str(seconds):
@@ -33,10 +72,15 @@ def time_str(seconds):
     minutes, seconds = divmod(remainder, 60)
     return f"{int(hours)}h {int(minutes)}m {int(seconds)}s"
 
+# Function: Get the transcription log CSV path for an input file.
+def get_log_csv_path(base_filename):
+    sanitized_filename = re.sub(r"[^\w\s]", "", base_filename.replace(" ", "_")).lower()
+    return os.path.join(chunking_log_dir, f"{sanitized_filename}_{run_timestamp}_translation_logs.csv")
+
 # Function: Save transcription logs to CSV.
+@profiled()
 def save_log_to_csv(log_data, base_filename):
-    sanitized_filename = re.sub(r"[^\w\s]", "", base_filename.replace(" ", "_")).lower()
-    csv_file_path = os.path.join(chunking_log_dir, f"{sanitized_filename}_{run_timestamp}_translation_logs.csv")
+    csv_file_path = get_log_csv_path(base_filename)
     headers = ["time_stamp", "file_name", "pk_id", "chunk_number", "chunk_length_in_seconds", "transcribed_text", "success_count", "failure_count", "estimated_time_remaining"]
 
     needs_header = not os.path.exists(csv_file_path)
@@ -61,13 +105,15 @@ def clear_transcribe_folder():
         print(f"Cleared the '{chunking_log_dir}' folder.")
 
 # Function: Use existing transcript if available.
-def use_existing_transcript_if_available(input_filepath, pk_id, base_filename):
+def use_existing_transcript_if_available(input_filepath, pk_id, base_filename, transcript_file_path=None):
     """
     Checks if a matching transcript file exists in the transcripts folder and uses it to populate the CSV.
+    The path recorded in the job manifest is used when given; otherwise it is derived from the filename.
     Returns True if a transcript was found and used, False otherwise.
     """
-    transcript_file_name = f"{base_filename}.txt"
-    transcript_file_path = os.path.join(transcripts_folder, transcript_file_name)
+    if transcript_file_path is None:
+        transcript_file_name = f"{base_filename}.txt"
+        transcript_file_path = os.path.join(transcripts_folder, transcript_file_name)
     if os.path.exists(transcript_file_path):
         with open(transcript_file_path, 'r', encoding='utf-8') as transcript_file:
             transcribed_text = transcript_file.read()
@@ -88,69 +134,177 @@ def use_existing_transcript_if_available(input_filepath, pk_id, base_filename):
         return True
     return False
 
+# Function: Reuse the transcript of a recording that was already transcribed.
+def use_duplicate_transcript(input_filepath, pk_id, base_filename, duplicate):
+    """Writes the stored transcript chunks of a fingerprint match to this file's CSV. Returns True if any were written."""
+    transcript_chunks = load_transcript_chunks(duplicate['recording_id'])
+    if not transcript_chunks:
+        return False
+    for chunk in transcript_chunks:
+        log_data = {
+            "time_stamp": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "file_name": os.path.basename(input_filepath),
+            "pk_id": pk_id,
+            "chunk_number": chunk['chunk_number'],
+            "chunk_length_in_seconds": chunk['chunk_length_in_seconds'],
+            "transcribed_text": chunk['transcribed_text'],
+            "success_count": "NA",  # Not re-counted for reused content
+            "failure_count": "NA",
+            "estimated_time_remaining": "NA"
+        }
+        save_log_to_csv(log_data, base_filename)
+    print(f"Reused the transcript of {duplicate['file_name']} (pk_id {duplicate['pk_id']}) for {os.path.basename(input_filepath)}: "
+          f"{duplicate['matching_hashes']} matching fingerprint hashes ({duplicate['match_ratio']:.0%}).")
+    return True
+
+# Function: Copy a finished transcription log into the durable transcript store.
+def store_transcript(pk_id, base_filename, manifest, transcript_source):
+    """Returns True once the transcript is stored durably."""
+    if pk_id is None:
+        return False
+    try:
+        with timer('transcript_store_seconds', help="Time to write a transcript to the transcript store."):
+            record_transcript_log(pk_id, get_log_csv_path(base_filename), manifest, transcript_source)
+        return True
+    except Exception as e:
+        print(f"Warning: Could not store the transcript for pk_id {pk_id}: {e}")
+        return False
+
+# Function: Delete a job's media, captions and decoded audio once its transcript is stored.
+def release_job_media(pk_id, input_filepath):
+    if pk_id is not None:
+        release_media(pk_id, extra_artifacts={'pcm': cache_path(input_filepath)} if os.path.exists(input_filepath) else None)
+
+# Function: Fingerprint decoded audio, returning None if it cannot be fingerprinted.
+def fingerprint_audio(audio, input_filepath):
+    try:
+        with timer('audio_fingerprint_seconds', help="Time to compute an acoustic fingerprint."), span('audio.fingerprint', file=os.path.basename(input_filepath)):
+            samples = pcm_samples(audio)
+            return compute_fingerprint(samples, audio.sample_rate) if samples is not None else None
+    except Exception as e:
+        print(f"Warning: Could not fingerprint {input_filepath}: {e}")
+        return None
+
 # Function: Process each audio file.
-def process_audio_file(input_filepath, file_number, total_files, total_duration_ms, processed_files_duration_so_far):
+@profiled()
+def process_audio_file(input_filepath, file_number, total_files, total_duration_ms, processed_files_duration_so_far, manifest=None):
+    import speech_recognition as sr
+    recognizer = get_recognizer()
     print(f"\nProcessing file {file_number} of {total_files}: {os.path.basename(input_filepath)}")
 
     base_filename = os.path.splitext(os.path.basename(input_filepath))[0]
+    file_start_time = time.time()
 
-    try:
-        pk_id_str = re.search(r"_pkid_(\d+)", base_filename).group(1)
-        pk_id = int(pk_id_str)
-    except AttributeError:
-        print(f"Warning: Could not extract pk_id from {input_filepath}. Setting pk_id to None.")
-        pk_id = None
+    if manifest is not None:
+        pk_id = manifest['pk_id']
+    else:
+        # Files without a manifest (e.g. dropped into the folder by hand) fall back to the filename.
+        try:
+            pk_id_str = re.search(r"_pkid_(\d+)", base_filename).group(1)
+            pk_id = int(pk_id_str)
+        except AttributeError:
+            print(f"Warning: Could not extract pk_id from {input_filepath}. Setting pk_id to None.")
+            pk_id = None
+
+    # Record the log path up front so 3_summarize_with_openai.py --follow can read chunks as they land.
+    if pk_id is not None:
+        update_manifest(pk_id, artifacts={'transcription_log': get_log_csv_path(base_filename)}, status='transcribing')
 
     # Check for an existing transcript before processing.
-    if use_existing_transcript_if_available(input_filepath, pk_id, base_filename):
+    if use_existing_transcript_if_available(input_filepath, pk_id, base_filename, get_artifact(manifest, 'captions') if manifest else None):
+        if pk_id is not None:
+            manifest = update_manifest(pk_id, artifacts={'transcription_log': get_log_csv_path(base_filename)}, status='transcribed', transcript_source='captions')
+        if store_transcript(pk_id, base_filename, manifest, 'captions'):
+            release_job_media(pk_id, input_filepath)
+        inc('files_transcribed_total', help="Files handled by the transcription stage.", source='captions')
+        observe('caption_transcript_seconds', time.time() - file_start_time, help="Wall time to handle a file from its captions.")
         return processed_files_duration_so_far  # Skip processing if transcript is used
 
     try:
-        audio = AudioSegment.from_file(input_filepath)
+        # Usually a cache hit: get_audio_duration_ms already decoded the file.
+        with span('audio.decode', file=os.path.basename(input_filepath)):
+            audio = decode_to_pcm(input_filepath, duration_seconds=(manifest or {}).get('source_duration_seconds'))
+    except WorkspaceFull as e:
+        print(f"Skipping {input_filepath} for now: {e}")
+        inc('files_transcribed_total', help="Files handled by the transcription stage.", source='workspace_full')
+        if pk_id is not None:
+            update_manifest(pk_id, status='deferred', error=str(e))  # The row stays pending for the next run
+        return processed_files_duration_so_far
     except Exception as e:
         print(f"Error loading {input_filepath}: {e}")
+        inc('files_transcribed_total', help="Files handled by the transcription stage.", source='decode_failed')
+        if pk_id is not None:
+            update_manifest(pk_id, status='transcription_failed', error=str(e))
         return processed_files_duration_so_far
 
+    # Skip the recognizer entirely when the same recording was transcribed before.
+    fingerprint = fingerprint_audio(audio, input_filepath)
+    duplicate = find_duplicate(fingerprint, len(audio))
+    if duplicate and use_duplicate_transcript(input_filepath, pk_id, base_filename, duplicate):
+        audio.close()
+        record_progress(len(audio))
+        inc('files_transcribed_total', help="Files handled by the transcription stage.", source='fingerprint')
+        inc('audio_seconds_deduplicated_total', len(audio) / 1000, help="Seconds of audio whose transcript was reused from a fingerprint match.")
+        if pk_id is not None:
+            manifest = update_manifest(pk_id, artifacts={'transcription_log': get_log_csv_path(base_filename)}, status='transcribed',
+                                       transcript_source='fingerprint', duplicate_of_pk_id=duplicate['pk_id'], duration_ms=len(audio))
+        if store_transcript(pk_id, base_filename, manifest, 'fingerprint'):
+            release_job_media(pk_id, input_filepath)
+        return processed_files_duration_so_far + len(audio)
+
     chunk_length_ms = GLOBAL_CHUNK_LENGTH * 1000
     processed_file_duration_ms = 0
     file_duration_ms = len(audio)
     total_chunks = len(audio) // chunk_length_ms + (1 if len(audio) % chunk_length_ms else 0)
     chunks_success = 0
     chunks_failure = 0
+    transcript_chunks = []
 
-    for i, chunk in enumerate(audio[i:i+chunk_length_ms] for i in range(0, len(audio), chunk_length_ms)):
-        chunk_name = "temp_chunk.wav"
-        chunk.export(chunk_name, format="wav")
+    for i, chunk_start_ms in enumerate(range(0, len(audio), chunk_length_ms)):
+        # Chunks are read from the memory-mapped PCM cache and handed over without a temp WAV file.
+        with profile_section('process_audio_file.chunk_slice'):
+            audio_listened = sr.AudioData(bytes(audio.frame_bytes(chunk_start_ms, chunk_start_ms + chunk_length_ms)), audio.sample_rate, audio.sample_width)
 
         text = ""
-        try:
-            with sr.AudioFile(chunk_name) as source:
-                audio_listened = recognizer.record(source)
-                text = recognizer.recognize_google(audio_listened)
+        chunk_result = 'success'
+        with span('transcribe.chunk', chunk_number=i + 1, start_second=i * GLOBAL_CHUNK_LENGTH) as chunk_span, profile_section('process_audio_file.chunk_recognize'):
+            try:
+                recognize_start = time.perf_counter()
+                try:
+                    text = recognizer.recognize_google(audio_listened)
+                finally:
+                    observe('recognizer_chunk_seconds', time.perf_counter() - recognize_start, help="Google SR latency per chunk.")
                 chunks_success += 1
                 print("==============================")
                 print(f"Processing chunk {i+1}/{total_chunks}.")
                 print(f"From second {i * GLOBAL_CHUNK_LENGTH}s to {(i+1) * GLOBAL_CHUNK_LENGTH}s.")
                 print(f"Total seconds in file: {file_duration_ms // 1000}.")
                 print("TRANSCRIBED TEXT: ", text)
-        except sr.UnknownValueError:
-            chunks_failure += 1
-            print(f"Chunk {i+1}: Google SR could not understand audio.")
-        except sr.RequestError as e:
-            chunks_failure += 1
-            print(f"Chunk {i+1}: Request failed; {e}")
-        finally:
-            os.remove(chunk_name)
+            except sr.UnknownValueError:
+                chunks_failure += 1
+                chunk_result = 'unknown_value'
+                print(f"Chunk {i+1}: Google SR could not understand audio.")
+            except sr.RequestError as e:
+                chunks_failure += 1
+                chunk_result = 'request_error'
+                print(f"Chunk {i+1}: Request failed; {e}")
+            finally:
+                inc('recognizer_chunks_total', help="Chunks sent to Google SR.", result=chunk_result)
+            chunk_span.set_attribute('result', chunk_result)
 
         processed_file_duration_ms += chunk_length_ms
-        updated_total_processed_duration_so_far = processed_files_duration_so_far + processed_file_duration_ms
+        updated_total_processed_duration_so_far = record_progress(chunk_length_ms)
         overall_elapsed_time = time.time() - start_time
-        processed_ratio = updated_total_processed_duration_so_far / total_duration_ms
-        estimated_total_time = overall_elapsed_time / processed_ratio
-        estimated_remaining_time = estimated_total_time - overall_elapsed_time
+        # The probes can all come back 0 (failed, or every other job skipped), which leaves no basis for an ETA.
+        if total_duration_ms:
+            processed_ratio = min(1.0, updated_total_processed_duration_so_far / total_duration_ms)
+            estimated_total_time = overall_elapsed_time / processed_ratio
+            estimated_time_remaining = time_str(estimated_total_time - overall_elapsed_time)
+        else:
+            estimated_time_remaining = "unknown"
 
         print(f"All files ({total_files}) total seconds: {total_duration_ms // 1000}")
-        print(f"Estimated time remaining for all files: {time_str(estimated_remaining_time)}")
+        print(f"Estimated time remaining for all files: {estimated_time_remaining}")
         print("==============================")
         
         log_data = {
@@ -162,51 +316,121 @@ def process_audio_file(input_filepath, file_number, total_files, total_duration_
             "transcribed_text": text,
             "success_count": chunks_success,
             "failure_count": chunks_failure,
-            "estimated_time_remaining": time_str(estimated_remaining_time)
+            "estimated_time_remaining": estimated_time_remaining
         }
         save_log_to_csv(log_data, base_filename)
+        transcript_chunks.append({"chunk_number": i + 1, "chunk_length_in_seconds": GLOBAL_CHUNK_LENGTH, "transcribed_text": text})
 
+    audio.close()
     processed_files_duration_so_far += file_duration_ms
 
+    # Index the recording so later copies of it can reuse this transcript.
+    if fingerprint and chunks_success:
+        register_recording(fingerprint, file_duration_ms, transcript_chunks, pk_id=pk_id, file_name=os.path.basename(input_filepath))
+
     # Log the individual processing summary
     print(f"===INDIVIDUAL PROCESSING for {os.path.basename(input_filepath)}===")
     print(f"Chunks successfully processed: {chunks_success}")
     print(f"Chunks failed to process: {chunks_failure}")
     print(f"% of success: {100. * chunks_success / total_chunks:.2f}%")
 
-    return processed_files_duration_so_far
+    inc('files_transcribed_total', help="Files handled by the transcription stage.", source='recognizer')
+    inc('audio_seconds_transcribed_total', file_duration_ms / 1000, help="Seconds of audio sent through the recognizer.")
+    observe('transcription_file_seconds', time.time() - file_start_time, help="Wall time to transcribe one file.")
+
+    if pk_id is not None:
+        manifest = update_manifest(
+            pk_id,
+            artifacts={'transcription_log': get_log_csv_path(base_filename)},
+            status='transcribed',
+            transcript_source='recognizer',
+            duration_ms=file_duration_ms,
+            chunk_length_seconds=GLOBAL_CHUNK_LENGTH,
+            chunks_total=total_chunks,
+            chunks_success=chunks_success,
+            chunks_failure=chunks_failure,
+            transcription_seconds=round(time.time() - file_start_time, 2),
+        )
+    if store_transcript(pk_id, base_filename, manifest, 'recognizer'):
+        release_job_media(pk_id, input_filepath)
 
-# Main processing block
-
-# Count and display the number of log files before deletion
-if os.path.exists(chunking_log_dir):
-    log_files_count = len([f for f in os.listdir(chunking_log_dir) if os.path.isfile(os.path.join(chunking_log_dir, f))])
-    print(f"Existing log files: {log_files_count}")
-
-    # Clear the transcribe folder
-    clear_transcribe_folder()
-
-# Ensure the transcribe folder exists after deletion
-if not os.path.exists(chunking_log_dir):
-    os.makedirs(chunking_log_dir)
-
-total_duration_ms = sum(get_audio_duration_ms(os.path.join(input_dir, filename))
-                        for filename in os.listdir(input_dir) 
-                        if os.path.splitext(filename)[1].lower() in supported_formats)
-
-total_files = sum(1 for filename in os.listdir(input_dir) 
-                  if os.path.splitext(filename)[1].lower() in supported_formats)
-
-processed_files_duration = 0
-current_file_number = 1
-start_time = time.time()
+    return processed_files_duration_so_far
 
-for filename in os.listdir(input_dir):
-    if os.path.splitext(filename)[1].lower() in supported_formats:
-        filepath = os.path.join(input_dir, filename)
-        processed_files_duration = process_audio_file(filepath, current_file_number, total_files, total_duration_ms, processed_files_duration)
-        current_file_number += 1
+# Function: Collect the files to transcribe as (filepath, manifest) pairs.
+def collect_transcription_jobs():
+    """
+    Jobs come from the manifests written by 1_download_audio.py. Supported files in the
+    input folder that no manifest refers to are still picked up, without a manifest.
+    """
+    jobs = []
+    claimed_paths = set()
+    for manifest in list_manifests(status='downloaded'):
+        media_path = get_artifact(manifest, 'media')
+        if media_path and os.path.splitext(media_path)[1].lower() in supported_formats:
+            jobs.append((media_path, manifest))
+            claimed_paths.add(os.path.abspath(media_path))
+
+    if os.path.exists(input_dir):
+        for filename in os.listdir(input_dir):
+            filepath = os.path.join(input_dir, filename)
+            if os.path.splitext(filename)[1].lower() in supported_formats and os.path.abspath(filepath) not in claimed_paths:
+                jobs.append((filepath, None))
+    return jobs
 
-end_time = time.time()
-print("\n=== Overall Transcription Summary ===")
-print(f"Total processing time: {time_str(end_time - start_time)} for {total_files} files.")
\ No newline at end of file
+# Main processing block
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe downloaded audio files.")
+    parser.add_argument('--profile', action='store_true', help="Write cProfile, tracemalloc and stack samples to profiles/<run_id>/.")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PIPELINE_WORKERS', 1)), help="Files to transcribe in parallel.")
+    args = parser.parse_args()
+
+    clear_stage_finished('2_transcribe_audio')
+    with profile_run('2_transcribe_audio', profiling_requested(args.profile)):
+        # Count and display the number of log files before deletion
+        if os.path.exists(chunking_log_dir):
+            log_files_count = len([f for f in os.listdir(chunking_log_dir) if os.path.isfile(os.path.join(chunking_log_dir, f))])
+            print(f"Existing log files: {log_files_count}")
+
+            # Clear the transcribe folder
+            clear_transcribe_folder()
+
+        # Ensure the transcribe folder exists after deletion
+        if not os.path.exists(chunking_log_dir):
+            os.makedirs(chunking_log_dir)
+
+        # Probe each file once; the durations drive both the ETA and the longest-first schedule.
+        transcription_jobs = [
+            {'filepath': filepath, 'manifest': manifest, 'duration_ms': get_audio_duration_ms(filepath, manifest)}
+            for filepath, manifest in collect_transcription_jobs()
+        ]
+
+        total_duration_ms = sum(job['duration_ms'] for job in transcription_jobs)
+
+        total_files = len(transcription_jobs)
+
+        start_time = time.time()
+
+        # Function: Transcribe one scheduled job (the scheduler's worker function).
+        def transcribe_job(job):
+            manifest = job['manifest']
+            with span('process_audio_file', pk_id=manifest['pk_id'] if manifest else None, file=os.path.basename(job['filepath'])):
+                return process_audio_file(job['filepath'], job['file_number'], total_files, total_duration_ms, 0, manifest)
+
+        for file_number, job in enumerate(sorted(transcription_jobs, key=lambda job: -job['duration_ms']), start=1):
+            job['file_number'] = file_number
+
+        run_scheduled(
+            transcription_jobs,
+            transcribe_job,
+            duration_fn=lambda job: job['duration_ms'],
+            workers=args.workers,
+            owner_fn=lambda job: (job['manifest'] or {}).get('email_address'),
+        )
+
+        end_time = time.time()
+        print("\n=== Overall Transcription Summary ===")
+        print(f"Total processing time: {time_str(end_time - start_time)} for {total_files} files.")
+
+        export_stage_metrics('2_transcribe_audio')
+        export_spans('2_transcribe_audio')
+    mark_stage_finished('2_transcribe_audio')
\ No newline at end of file
@@ -3,93 +3,191 @@ import csv
 import datetime
 from pathlib import Path
 import json
-from tqdm import tqdm
-import pandas as pd
-import tiktoken
-from openai import OpenAI
 import re
-from dotenv import load_dotenv
-load_dotenv()
+import time
+import tempfile
+import argparse
+from functools import lru_cache
 
+# pandas, tiktoken, openai and gmail_utils are imported inside the functions that
+# use them; the credentials they need are resolved on first use, not at import.
 from audio_postgres_utils import update_completion_boolean_with_pk_id, fetch_user_email_and_request_by_pkid
+from job_manifest import list_manifests, update_manifest, get_artifact, stage_finished
+from pipeline_metrics import inc, timer, export_stage_metrics
+from pipeline_tracing import span, finish_job_trace, export_spans
+from pipeline_profiling import profile_run, profiling_requested, profiled, profile_section
+from model_router import route_models, complete_with_fallback
+from transcript_store import record_summary
 
 import sys
 sys.path.append('../')  # Adjust path to import from parent directory
-from gmail_utils.gmail_utils import send_email  # Modify according to your directory structure
 
 # Configurable Variables
 CHUNKING_LOG_DIR = "transcribe"  # Directory where transcribed text files are located
 
 # OpenAI configuration
-OPENAI_API_KEY = os.getenv("2023nov17_OPENAI_KEY")
-MODEL = 'gpt-4-turbo'  # Model name
-MODEL_LIMIT = 128000  # Maximum number of tokens the model can handle
-INPUT_COST_PER_MILLION = 10.00  # Cost per 1M tokens for input per https://openai.com/api/pricing
-OUTPUT_COST_PER_MILLION = 30.00  # Cost per 1M tokens for output
+OPENAI_API_KEY_ENV = "2023nov17_OPENAI_KEY"
+MODEL = 'gpt-4-turbo'  # Default model and tokenizer; model_router.py picks the model per request
+# Context limits and costs per 1M tokens (https://openai.com/api/pricing) are in model_router.DEFAULT_MODEL_TABLE
 
 def calculate_cost(token_count, cost_per_million):
     return (token_count / 1_000_000) * cost_per_million
 
+TRIMMED_TRANSCRIPT_CHARS = 2_000_000  # Starting size of the fallback transcript when results are over budget
+
 GLOBAL_SYSTEM_PROMPT = "Summarize the following text."
+
+FOLLOW_POLL_SECONDS = 2  # How often --follow checks the transcription logs for new chunks
 GLOBAL_OPENAI_TEMPERATURE = 1
 
+# Function to resolve the OpenAI API key from the environment (.env loaded on first use)
+@lru_cache(maxsize=None)
+def get_openai_api_key():
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv(OPENAI_API_KEY_ENV)
+
 # Function to get chat completion from OpenAI
-def get_chat_completion(messages, filename, model=MODEL, api_key=OPENAI_API_KEY):
-    client = OpenAI(api_key=api_key)
+def get_chat_completion(messages, filename, model=MODEL, api_key=None):
+    from openai import OpenAI
+    client = OpenAI(api_key=api_key or get_openai_api_key())
     
     # Making the API call
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=GLOBAL_OPENAI_TEMPERATURE,
-    )
+    try:
+        with timer('openai_request_seconds', help="OpenAI chat completion latency.", model=model), span('openai.chat_completion', model=model):
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=GLOBAL_OPENAI_TEMPERATURE,
+            )
+    except Exception:
+        inc('openai_requests_total', help="OpenAI chat completion requests.", model=model, result='failure')
+        raise
+    inc('openai_requests_total', help="OpenAI chat completion requests.", model=model, result='success')
 
     # Converting the response to JSON-compatible format
     response_data = response.to_dict()
+    usage = response_data.get('usage') or {}
+    inc('openai_tokens_total', usage.get('prompt_tokens', 0), help="Tokens reported by OpenAI.", model=model, kind='prompt')
+    inc('openai_tokens_total', usage.get('completion_tokens', 0), help="Tokens reported by OpenAI.", model=model, kind='completion')
     print("Response data (full JSON):")
     print(json.dumps(response_data, indent=4))  # Pretty print the full response data
     
     return response_data
 
-# Function to tokenize the text
-def tokenize(text):
-    encoding = tiktoken.encoding_for_model(MODEL)
-    return encoding.encode(text)
+# Function to send messages to the model picked by model_router, falling back to the next candidate on errors.
+# Pass route, the (candidates, token_count) of route_request, to reuse a routing decision already made.
+def get_routed_completion(messages, filename, custom_prompt=False, route=None):
+    candidates, token_count = route or route_request([message['content'] for message in messages], custom_prompt)
+    return complete_with_fallback(lambda model: get_chat_completion(messages, filename, model=model), candidates, token_count)
+
+# Function to route a request and count its tokens with the tokenizer of the model it was routed to.
+# The route is picked on the default tokenizer's count, since the model is not known before it.
+def route_request(texts, custom_prompt=False):
+    token_count = sum(len(tokenize(text)) for text in texts)
+    candidates = route_models(token_count, custom_prompt)
+    routed_model = candidates[0]['model']
+    if get_encoding(routed_model).name != get_encoding().name:
+        token_count = sum(len(tokenize(text, routed_model)) for text in texts)
+    return candidates, token_count
+
+# Function to load the tokenizer for a model (cached; building it is expensive)
+@lru_cache(maxsize=None)
+def get_encoding(model=MODEL):
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        if model == MODEL:
+            raise
+        return get_encoding()  # A model tiktoken does not know, e.g. from MODEL_ROUTING_TABLE
+
+# Function to tokenize the text with the tokenizer of the given model
+@profiled()
+def tokenize(text, model=MODEL):
+    return get_encoding(model).encode(text)
+
+# Function to compress the result files for one pk_id into a zip that fits the email budget.
+# Falls back to a trimmed transcript when the full results are too large to send.
+# Returns (attachments, trimmed); trimmed is only True when a trimmed transcript was attached.
+def package_result_attachments(transcription_files, pk_id, package_dir, transcript_text=None):
+    from gmail_utils.gmail_utils import package_attachments, encoded_attachment_size, ATTACHMENT_BUDGET_BYTES
+
+    archive_path = os.path.join(package_dir, f"results_pkid_{pk_id}.zip")
+    package_attachments(transcription_files, archive_path)
+    if encoded_attachment_size(archive_path) <= ATTACHMENT_BUDGET_BYTES:
+        return [archive_path], False
+
+    if transcript_text is None:
+        print(f"Results for pk_id {pk_id} exceed the {ATTACHMENT_BUDGET_BYTES // (1024 * 1024)} MB attachment budget and there is no transcript to trim. Sending without attachments.")
+        return [], False
+
+    print(f"Results for pk_id {pk_id} exceed the {ATTACHMENT_BUDGET_BYTES // (1024 * 1024)} MB attachment budget. Attaching a trimmed transcript instead.")
+
+    trimmed_path = os.path.join(package_dir, f"transcript_trimmed_pkid_{pk_id}.txt")
+    archive_path = os.path.join(package_dir, f"transcript_trimmed_pkid_{pk_id}.zip")
+    keep_chars = min(len(transcript_text), TRIMMED_TRANSCRIPT_CHARS)
+    while keep_chars > 0:
+        with open(trimmed_path, 'w', encoding='utf-8') as trimmed_file:
+            trimmed_file.write(transcript_text[:keep_chars])
+            if keep_chars < len(transcript_text):
+                trimmed_file.write(f"\n\n[Transcript trimmed to the first {keep_chars} of {len(transcript_text)} characters to fit the email size limit.]\n")
+        package_attachments([trimmed_path], archive_path)
+        if encoded_attachment_size(archive_path) <= ATTACHMENT_BUDGET_BYTES:
+            return [archive_path], True
+        keep_chars //= 2
+    print(f"No trimmed transcript for pk_id {pk_id} fits the attachment budget. Sending without attachments.")
+    return [], False
 
 # Function to send email with attachments
-def send_email_with_attachments(transcription_dir, pk_id, user_email, summary_content, prompt, original_filename, download_time):
+def send_email_with_attachments(transcription_dir, pk_id, user_email, summary_content, prompt, original_filename, download_time, transcript_text=None, transcription_files=None):
     """
     Send an email with attachments that only match the current pk_id being processed.
+    Pass transcription_files (from the job manifest) to skip scanning transcription_dir.
+    The files are sent as one compressed zip, or as a trimmed transcript when over the size budget.
     """
-    transcription_files = []
+    from gmail_utils.gmail_utils import send_email  # Modify according to your directory structure
 
-    for file in transcription_dir.glob(f"*_pkid_{pk_id}_*"):
-        transcription_files.append(str(file))
+    if transcription_files is None:
+        transcription_files = [str(file) for file in transcription_dir.glob(f"*_pkid_{pk_id}_*")]
     
     if user_email and transcription_files:
         user_name = user_email.split('@')[0].replace('.', ' ').title()
         is_default_prompt = prompt.strip() == GLOBAL_SYSTEM_PROMPT
-        
-        email_body = f"""
-        <html>
-            <body>
-                <p>Hello {user_name},</p>
-                <p>Welcome! What you're seeing here is the result of our audio processing script. We downloaded, transcribed, and summarized the audio content you provided.</p>
-                <p>{'You provided a custom prompt for this request.' if not is_default_prompt else 'We used our default prompt to process your audio.'}</p>
-                <p><strong>What you asked:</strong></p>
-                <p><i>{prompt}</i></p>
-                <p><strong>Here is the response to your request:</strong></p>
-                <p><i>{summary_content}</i></p>
-                <p><strong>Original Filename:</strong> {original_filename}</p>
-                <p><strong>Downloaded Time:</strong> {download_time}</p>
-            </body>
-        </html>
-        """
         subject = "Results from Your Audio Processing Request"
         to_emails = [user_email]
-        
-        send_email(subject, email_body, to_emails, transcription_files, is_html=True)
-        print(f"Email with {len(transcription_files)} attachments successfully sent to {user_email}")
+
+        with tempfile.TemporaryDirectory() as package_dir:
+            attachments, trimmed = package_result_attachments(transcription_files, pk_id, package_dir, transcript_text)
+            if trimmed:
+                trimmed_notice = "<p>Your full results were too large to email, so the attachment contains the first part of the transcript.</p>"
+            elif not attachments:
+                trimmed_notice = "<p>Your results were too large to email, so no files are attached.</p>"
+            else:
+                trimmed_notice = ""
+
+            email_body = f"""
+            <html>
+                <body>
+                    <p>Hello {user_name},</p>
+                    <p>Welcome! What you're seeing here is the result of our audio processing script. We downloaded, transcribed, and summarized the audio content you provided.</p>
+                    <p>{'You provided a custom prompt for this request.' if not is_default_prompt else 'We used our default prompt to process your audio.'}</p>
+                    <p><strong>What you asked:</strong></p>
+                    <p><i>{prompt}</i></p>
+                    <p><strong>Here is the response to your request:</strong></p>
+                    <p><i>{summary_content}</i></p>
+                    <p><strong>Original Filename:</strong> {original_filename}</p>
+                    <p><strong>Downloaded Time:</strong> {download_time}</p>
+                    {trimmed_notice}
+                </body>
+            </html>
+            """
+
+            # Attachments are encoded into the message before send_email returns, so the
+            # temporary archive can be removed while the email waits on the shared SMTP connection.
+            with span('send_email', attachments=len(attachments), trimmed=trimmed):
+                send_email(subject, email_body, to_emails, attachments, is_html=True, wait=False)
+        print(f"Email with {len(transcription_files)} result file(s) in {len(attachments)} compressed attachment(s) queued for {user_email}")
     else:
         print(f"No relevant transcription files found for pk_id {pk_id}, or no email associated.")
 
@@ -134,106 +232,236 @@ def parse_filename(filename):
     else:
         return "Unknown", "Unknown"
 
-# Function to read and summarize CSV files
-def read_and_summarize_csv_files():
-    total_cost_across_all_files = 0
-    chunking_log_dir = Path(CHUNKING_LOG_DIR)
-    print(f"Looking for CSV files in the directory: {chunking_log_dir}")
-    csv_files = list(chunking_log_dir.glob("*.csv"))
+# Function to build the system prompt for a transcription log: the user's own request, or the default
+def build_summary_prompt(csv_file_name, user_request):
+    if user_request:
+        return user_request
+    return f"""
+        You are being passed data about an audio file we attempted to transcribe with the filename: {csv_file_name}. 
+        Please read the provided text content and summarize the main points in bullet points, focusing on topics, themes, or notable elements discussed. 
+        If you find the text content sparse or absent, then refer to the filename to deduce what the audio could be about, 
+        and summarize potential topics in bullet points. 
+        Use the filename only as a last resort for deducing the content's nature.
+        """
 
-    if not csv_files:
-        print("No CSV files found in the specified directory. Exiting the function.")
-        return
-    else:
-        print(f"Found {len(csv_files)} CSV file(s) in the directory.")
+# Function to collect the transcription logs to summarize as (csv_path, manifest) pairs.
+# Logs recorded in job manifests are used directly; CSVs in the folder that no manifest
+# refers to are still picked up, without a manifest. Logs of jobs that are already summarized
+# (e.g. by --follow) or listed in skip_pk_ids are claimed but not returned.
+def collect_summarization_jobs(chunking_log_dir, skip_pk_ids=()):
+    jobs = []
+    claimed_paths = set()
+    for manifest in list_manifests():
+        log_path = get_artifact(manifest, 'transcription_log')
+        if not log_path:
+            continue
+        claimed_paths.add(os.path.abspath(log_path))
+        if manifest.get('status') != 'summarized' and manifest['pk_id'] not in skip_pk_ids:
+            jobs.append((Path(log_path), manifest))
 
-    for csv_file_path in csv_files:
+    for csv_file_path in chunking_log_dir.glob("*.csv"):
         if csv_file_path.name.endswith("_summarized_response.csv"):
-            print(f"Skipping already summarized file: {csv_file_path}")
             continue
-
-        print(f"\nReading CSV file {csv_file_path}...")
-
+        if os.path.abspath(csv_file_path) not in claimed_paths:
+            jobs.append((csv_file_path, None))
+    return jobs
+
+# Function to summarize one transcription log, save the summary and email the user.
+# Returns the estimated OpenAI cost, or 0 when the file is skipped.
+# With a RollingSummarizer (from --follow) that already saw the chunks, only its final reduce is requested here.
+def summarize_csv_file(csv_file_path, manifest, chunking_log_dir, summarizer=None):
+    import pandas as pd
+    print(f"\nReading CSV file {csv_file_path}...")
+
+    if manifest is not None:
+        pk_id = str(manifest['pk_id'])
+        print(f"Using pk_id from job manifest: {pk_id}")
+    else:
         # Extracting pk_id using regular expression to ensure each file can be uniquely identified if needed.
         pk_id_match = re.search(r"_pkid_([0-9]+)_", csv_file_path.name)
         pk_id = pk_id_match.group(1) if pk_id_match else "NULL"
         print(f"Extracted pk_id from filename: {pk_id}")
 
+    with timer('csv_load_seconds', help="Time to load a transcription log CSV."), profile_section('pandas.read_csv'):
         df = pd.read_csv(csv_file_path)
 
-        if 'transcribed_text' not in df.columns:
-            print(f"Expected 'transcribed_text' column not found in {csv_file_path}. Skipping this file.")
-            continue
-        else:
-            print("Successfully located 'transcribed_text' column. Compiling text for summarization...")
-
-        complete_text = ' '.join(df['transcribed_text'].fillna('').values)
-        print("Text compiled from CSV. Preparing to request summarization...")
-        token_count = len(tokenize(complete_text))  # Using the tokenize function here to count tokens
-        
-        used_percentage = (token_count / MODEL_LIMIT) * 100
-        used_percentage_formatted = f"{used_percentage:.7f}%"
-        input_cost_estimate = calculate_cost(token_count, INPUT_COST_PER_MILLION)
-        output_cost_estimate = calculate_cost(token_count, OUTPUT_COST_PER_MILLION)
-        total_cost_estimate = input_cost_estimate + output_cost_estimate
-
-        # Update the cumulative total cost
-        total_cost_across_all_files += total_cost_estimate
-        
-        print(f"Token count for current combined chunks: {token_count}")
-        print(f"Model = {MODEL}")
-        print(f"Limit = {MODEL_LIMIT}")
-        print(f"% used of limit = {token_count}/{MODEL_LIMIT} = {used_percentage_formatted}")
-        print(f"Estimated input cost: ${input_cost_estimate:.7f}")
-        print(f"Estimated output cost: ${output_cost_estimate:.7f}")
-        print(f"Total estimated cost: ${total_cost_estimate:.7f}")
+    if 'transcribed_text' not in df.columns:
+        print(f"Expected 'transcribed_text' column not found in {csv_file_path}. Skipping this file.")
+        return 0
+    else:
+        print("Successfully located 'transcribed_text' column. Compiling text for summarization...")
+
+    complete_text = ' '.join(df['transcribed_text'].fillna('').values)
+    print("Text compiled from CSV. Preparing to request summarization...")
+    user_email, user_request = fetch_user_email_and_request_by_pkid(pk_id=pk_id)
+
+    # Counts and estimates use the model the router picks first; a fallback model may answer instead.
+    with timer('tokenize_seconds', help="Time to count transcript tokens with tiktoken."):
+        route = route_request([complete_text], custom_prompt=bool(user_request))
+    candidates, token_count = route
+    routed_model = candidates[0]
+    model_limit = routed_model['context_limit']
+    used_percentage = (token_count / model_limit) * 100
+    used_percentage_formatted = f"{used_percentage:.7f}%"
+    input_cost_estimate = calculate_cost(token_count, routed_model['input_cost_per_million'])
+    output_cost_estimate = calculate_cost(token_count, routed_model['output_cost_per_million'])
+    total_cost_estimate = input_cost_estimate + output_cost_estimate
+    
+    print(f"Token count for current combined chunks: {token_count}")
+    print(f"Model = {routed_model['model']}")
+    print(f"Limit = {model_limit}")
+    print(f"% used of limit = {token_count}/{model_limit} = {used_percentage_formatted}")
+    print(f"Estimated input cost: ${input_cost_estimate:.7f}")
+    print(f"Estimated output cost: ${output_cost_estimate:.7f}")
+    print(f"Total estimated cost: ${total_cost_estimate:.7f}")
   
-        output_filename = str(csv_file_path).replace(".csv", "_summarized_response.csv")
-        
-        user_email, user_request = fetch_user_email_and_request_by_pkid(pk_id=pk_id)
-        
+    output_filename = str(csv_file_path).replace(".csv", "_summarized_response.csv")
+    
+    if manifest is not None and manifest.get('title'):
+        original_filename, download_time = manifest['title'], manifest.get('downloaded_at', "Unknown")
+    else:
         original_filename, download_time = parse_filename(csv_file_path.name)
 
-        if user_request:
-            file_specific_prompt = user_request
-        else:
-            file_specific_prompt = f"""
-            You are being passed data about an audio file we attempted to transcribe with the filename: {csv_file_path.name}. 
-            Please read the provided text content and summarize the main points in bullet points, focusing on topics, themes, or notable elements discussed. 
-            If you find the text content sparse or absent, then refer to the filename to deduce what the audio could be about, 
-            and summarize potential topics in bullet points. 
-            Use the filename only as a last resort for deducing the content's nature.
-            """
+    file_specific_prompt = build_summary_prompt(csv_file_path.name, user_request)
 
+    if summarizer is not None:
+        response_data = summarizer.finish(file_specific_prompt, complete_text)
+    else:
         messages = [{"role": "system", "content": file_specific_prompt},
                     {"role": "user", "content": complete_text}]
-        
-        response_data = get_chat_completion(messages, csv_file_path.name) 
 
-        print(f"Received response for {csv_file_path.name}. Proceeding to save the summary...")      
+        response_data = get_routed_completion(messages, csv_file_path.name, route=route)
+
+    print(f"Received response for {csv_file_path.name}. Proceeding to save the summary...")      
+
+    save_response_to_csv(response_data, complete_text, output_filename, pk_id, token_count, input_cost_estimate, output_cost_estimate, total_cost_estimate)
 
-        save_response_to_csv(response_data, complete_text, output_filename, pk_id, token_count, input_cost_estimate, output_cost_estimate, total_cost_estimate)
+    print(f"Summary successfully saved as {output_filename}")
 
-        print(f"Summary successfully saved as {output_filename}")
+    # Keep the summary and its usage in the durable store; the CSVs are cleared by the next run.
+    if pk_id.isdigit():
+        try:
+            record_summary(int(pk_id), response_data, file_specific_prompt, token_count, total_cost_estimate)
+        except Exception as e:
+            print(f"Warning: Could not store the summary for pk_id {pk_id}: {e}")
 
-        # After saving the summary successfully
-        update_completion_boolean_with_pk_id(pk_id=pk_id)
+    if manifest is not None:
+        manifest = update_manifest(
+            manifest['pk_id'],
+            artifacts={'summary': output_filename},
+            status='summarized',
+            summary_id=response_data['id'],
+            summary_model=response_data['model'],
+            token_count=token_count,
+            total_cost_estimate=total_cost_estimate,
+        )
+
+    # After saving the summary successfully
+    update_completion_boolean_with_pk_id(pk_id=pk_id)
+
+    # Prepare the OpenAI summary content from the response_data obtained from OpenAI
+    openai_summary = response_data['choices'][0]['message']['content'] if response_data and response_data['choices'] else "No summary available."
+
+    # Then call send_email_with_attachments with the correctly set variables
+    if user_email:  # Check if user_email was successfully fetched
+        result_files = None
+        if manifest is not None:
+            result_files = [artifact for artifact in (get_artifact(manifest, 'transcription_log'), get_artifact(manifest, 'summary')) if artifact]
+        send_email_with_attachments(chunking_log_dir, pk_id, user_email, openai_summary, file_specific_prompt, original_filename, download_time, transcript_text=complete_text, transcription_files=result_files)
+    else:
+        print(f"Could not fetch email for pk_id: {pk_id} or no files found to attach. No email sent.")
+
+    return total_cost_estimate
+
+# Function to summarize jobs while 2_transcribe_audio.py is still transcribing them.
+# Each job's log is followed as chunks land; partial summaries run in the background and only
+# the final reduce is left when the job is marked transcribed. Returns (total_cost, summarized manifests).
+def follow_and_summarize(chunking_log_dir):
+    from incremental_summarizer import TranscriptLogFollower, RollingSummarizer
+    followers = {}
+    finished_pk_ids = set()
+    summarized_manifests = []
+    total_cost = 0
+    print("Following transcription logs until 2_transcribe_audio.py finishes...")
+
+    while True:
+        # Checked before the manifests, so the last pass sees every job's final status.
+        transcription_finished = stage_finished('2_transcribe_audio')
+        for manifest in list_manifests():
+            pk_id = manifest['pk_id']
+            if pk_id in finished_pk_ids or manifest.get('status') not in ('transcribing', 'transcribed'):
+                continue
+            log_path = manifest['artifacts'].get('transcription_log')
+
+            if pk_id not in followers:
+                _, user_request = fetch_user_email_and_request_by_pkid(pk_id=pk_id)
+                prompt = build_summary_prompt(os.path.basename(log_path), user_request)
+                complete_fn = lambda messages, label, custom_prompt=bool(user_request): get_routed_completion(messages, label, custom_prompt=custom_prompt)
+                followers[pk_id] = (TranscriptLogFollower(log_path),
+                                    RollingSummarizer(prompt, os.path.basename(log_path), complete_fn, lambda text: len(tokenize(text))))
+            follower, summarizer = followers[pk_id]
+            for text in follower.read_new_texts():
+                summarizer.add_text(text)
+
+            if manifest['status'] == 'transcribed':
+                with span('summarize_job', pk_id=pk_id, file=os.path.basename(log_path), partial_summaries=len(summarizer.partials)):
+                    total_cost += summarize_csv_file(Path(log_path), manifest, chunking_log_dir, summarizer=summarizer)
+                finished_pk_ids.add(pk_id)
+                summarized_manifests.append(manifest)
+
+        if transcription_finished:
+            return total_cost, summarized_manifests
+        time.sleep(FOLLOW_POLL_SECONDS)
+
+# Function to read and summarize CSV files
+def read_and_summarize_csv_files(follow=False):
+    from gmail_utils.gmail_utils import close_mailer
+    total_cost_across_all_files = 0
+    chunking_log_dir = Path(CHUNKING_LOG_DIR)
+    followed_manifests = []
+    try:
+        if follow:
+            total_cost_across_all_files, followed_manifests = follow_and_summarize(chunking_log_dir)
 
-        # Prepare the OpenAI summary content from the response_data obtained from OpenAI
-        openai_summary = response_data['choices'][0]['message']['content'] if response_data and response_data['choices'] else "No summary available."
+        print(f"Looking for transcription logs from job manifests and in the directory: {chunking_log_dir}")
+        summarization_jobs = collect_summarization_jobs(chunking_log_dir, skip_pk_ids={manifest['pk_id'] for manifest in followed_manifests})
 
-        # Then call send_email_with_attachments with the correctly set variables
-        if user_email:  # Check if user_email was successfully fetched
-            send_email_with_attachments(chunking_log_dir, pk_id, user_email, openai_summary, file_specific_prompt, original_filename, download_time)
+        if not summarization_jobs and not followed_manifests:
+            print("No CSV files found in the specified directory. Exiting the function.")
+            return
         else:
-            print(f"Could not fetch email for pk_id: {pk_id} or no files found to attach. No email sent.")
+            print(f"Found {len(summarization_jobs)} CSV file(s) to summarize.")
+
+        for csv_file_path, manifest in summarization_jobs:
+            with span('summarize_job', pk_id=manifest['pk_id'] if manifest else None, file=csv_file_path.name):
+                total_cost_across_all_files += summarize_csv_file(csv_file_path, manifest, chunking_log_dir)
+        summarization_jobs += [(None, manifest) for manifest in followed_manifests]
+    finally:
+        # Wait for queued emails to go out over the shared connection, also when a later job failed:
+        # their rows are already marked complete, so the emails would otherwise never be sent.
+        email_failures = close_mailer()
+        for recipient, error in email_failures:
+            print(f"Failed to send email to {recipient}: {error}")
+
+    # Close each job's end-to-end trace now that its email has gone out
+    for _, manifest in summarization_jobs:
+        if manifest is not None:
+            finish_job_trace(manifest['pk_id'])
 
     # Print the cumulative total cost at the end
     print("===SUMMARY RESULTS===")
     print(f"Total cost incurred for OpenAI API calls across all files: ${total_cost_across_all_files:.2f}")
 
 def main():
-    read_and_summarize_csv_files()
+    parser = argparse.ArgumentParser(description="Summarize transcriptions with OpenAI and email the results.")
+    parser.add_argument('--profile', action='store_true', help="Write cProfile, tracemalloc and stack samples to profiles/<run_id>/.")
+    parser.add_argument('--follow', action='store_true', help="Summarize jobs incrementally while 2_transcribe_audio.py is still running.")
+    args = parser.parse_args()
+
+    with profile_run('3_summarize_with_openai', profiling_requested(args.profile)):
+        read_and_summarize_csv_files(follow=args.follow)
+    export_stage_metrics('3_summarize_with_openai')
+    export_spans('3_summarize_with_openai')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,250 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import Counter
+
+# Acoustic fingerprints for recognising a recording that has already been transcribed,
+# e.g. a re-uploaded Drive file or a YouTube mirror of the same audio.
+#
+# A fingerprint is a set of spectral peak hashes: the loudest frequency bins of a
+# short-time spectrum are paired with the peaks that follow them, and each pair is
+# packed into (anchor frequency, target frequency, time delta). Only the most
+# prominent peaks of each ~1 s slice are kept, so a recording stores roughly
+# PEAKS_PER_SLICE * FAN_OUT hashes per second. Matching counts the
+# hashes a new file shares with an indexed recording at one consistent time offset,
+# so re-encoding, volume changes and a different container still match.
+#
+# numpy is optional; without it fingerprinting is skipped and every file is transcribed.
+
+FINGERPRINT_DIR = "fingerprints"
+FINGERPRINT_INDEX_PATH = os.path.join(FINGERPRINT_DIR, "fingerprint_index.sqlite")
+
+FINGERPRINT_SAMPLE_RATE = 8000
+FFT_WINDOW_SIZE = 1024
+FFT_HOP_SIZE = 512
+PEAK_BANDS = [(0, 10), (10, 20), (20, 40), (40, 80), (80, 160), (160, 512)]
+PEAK_THRESHOLD_DB = 6.0
+PEAK_SLICE_FRAMES = 16  # About one second at FFT_HOP_SIZE 512 and 8 kHz
+PEAKS_PER_SLICE = 12
+FAN_OUT = 2
+# Frames per spectrogram block (about two minutes of audio). Samples are read from the
+# memmap, decimated, converted and transformed one block at a time, so working memory is
+# about 50 MB per worker whatever the file length. Only the peak and hash lists grow with
+# it, by a few MB per hour of audio.
+# A multiple of PEAK_SLICE_FRAMES, so no slice spans two blocks.
+SPECTROGRAM_BLOCK_FRAMES = 128 * PEAK_SLICE_FRAMES
+MAX_TIME_DELTA_FRAMES = 63
+
+MIN_MATCHING_HASHES = 25
+MIN_MATCH_RATIO = 0.2
+DURATION_TOLERANCE_SECONDS = 2.0
+
+_index_lock = threading.Lock()
+_warned_missing_numpy = False
+
+def _numpy():
+    """Return numpy, or None (logging once) when it is not installed."""
+    global _warned_missing_numpy
+    try:
+        import numpy as np
+        return np
+    except ImportError:
+        if not _warned_missing_numpy:
+            logging.warning("numpy is not installed; audio fingerprint deduplication is disabled.")
+            _warned_missing_numpy = True
+        return None
+
+def pcm_samples(pcm_audio):
+    """Samples of a pcm_cache.PcmAudio as its read-only int16 memmap (no copy), or None without numpy."""
+    if _numpy() is None:
+        return None
+    return pcm_audio.samples()
+
+def _block_samples(np, samples, step, start, end):
+    """Samples [start, end) at FINGERPRINT_SAMPLE_RATE as float32, read from `step` times the rate."""
+    if step == 1:
+        return samples[start:end].astype(np.float32)
+    # Average each group of `step` samples: a cheap low-pass and decimation of just this block.
+    return samples[start * step:end * step].reshape(-1, step).mean(axis=1, dtype=np.float32)
+
+def compute_fingerprint(samples, sample_rate=FINGERPRINT_SAMPLE_RATE):
+    """
+    Return a list of (hash, frame_offset) pairs for mono samples at FINGERPRINT_SAMPLE_RATE or a multiple of
+    it (e.g. the 16 kHz memmap from pcm_samples), which is decimated block by block.
+    Returns an empty list for audio shorter than one FFT window, or None without numpy.
+    """
+    np = _numpy()
+    if np is None:
+        return None
+    if sample_rate % FINGERPRINT_SAMPLE_RATE:
+        raise ValueError(f"Fingerprints expect a multiple of {FINGERPRINT_SAMPLE_RATE} Hz, got {sample_rate} Hz")
+    step = sample_rate // FINGERPRINT_SAMPLE_RATE
+    samples = np.asarray(samples)  # A memmap stays a memmap
+    sample_count = len(samples) // step
+    if sample_count < FFT_WINDOW_SIZE:
+        return []
+
+    frame_count = 1 + (sample_count - FFT_WINDOW_SIZE) // FFT_HOP_SIZE
+    window = np.hanning(FFT_WINDOW_SIZE).astype(np.float32)
+    peaks = []
+    for block_start in range(0, frame_count, SPECTROGRAM_BLOCK_FRAMES):
+        # Only this block's samples are read, converted and framed (as a strided view) at a time.
+        block_frames = min(SPECTROGRAM_BLOCK_FRAMES, frame_count - block_start)
+        first_sample = block_start * FFT_HOP_SIZE
+        block_samples = _block_samples(np, samples, step, first_sample,
+                                       first_sample + (block_frames - 1) * FFT_HOP_SIZE + FFT_WINDOW_SIZE)
+        frames = np.lib.stride_tricks.as_strided(
+            block_samples,
+            shape=(block_frames, FFT_WINDOW_SIZE),
+            strides=(block_samples.strides[0] * FFT_HOP_SIZE, block_samples.strides[0]),
+            writeable=False,
+        )
+        block = frames * window
+        spectrogram = 20 * np.log10(np.abs(np.fft.rfft(block, axis=1)) + 1e-6)
+
+        # One candidate peak per band and frame, kept when it stands out from the frame's mean level.
+        frame_means = spectrogram.mean(axis=1)
+        block_rows = np.arange(len(block))
+        candidates = {}
+        for low, high in PEAK_BANDS:
+            band = spectrogram[:, low:high]
+            bins = band.argmax(axis=1)
+            prominence = band[block_rows, bins] - frame_means
+            for row in np.nonzero(prominence > PEAK_THRESHOLD_DB)[0]:
+                frame = block_start + int(row)
+                candidates.setdefault(frame // PEAK_SLICE_FRAMES, []).append((float(prominence[row]), frame, int(bins[row]) + low))
+        # Keep the most prominent peaks of each time slice.
+        for slice_peaks in candidates.values():
+            peaks.extend((frame, peak_bin) for _, frame, peak_bin in sorted(slice_peaks, reverse=True)[:PEAKS_PER_SLICE])
+    peaks.sort()
+
+    # Pair every anchor peak with the next FAN_OUT peaks in its target zone.
+    hashes = []
+    for index, (anchor_frame, anchor_bin) in enumerate(peaks):
+        paired = 0
+        for target_frame, target_bin in peaks[index + 1:]:
+            delta = target_frame - anchor_frame
+            if delta == 0:
+                continue
+            if delta > MAX_TIME_DELTA_FRAMES or paired >= FAN_OUT:
+                break
+            hashes.append(((anchor_bin << 16) | (target_bin << 6) | delta, anchor_frame))
+            paired += 1
+    return hashes
+
+def _connect(index_path):
+    os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+    connection = sqlite3.connect(index_path, timeout=30)
+    connection.executescript("""
+        CREATE TABLE IF NOT EXISTS recordings (
+            recording_id INTEGER PRIMARY KEY,
+            pk_id INTEGER,
+            file_name TEXT,
+            duration_ms INTEGER,
+            hash_count INTEGER,
+            created_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS hashes (
+            hash INTEGER NOT NULL,
+            recording_id INTEGER NOT NULL,
+            frame_offset INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS hashes_by_hash ON hashes (hash);
+        CREATE TABLE IF NOT EXISTS transcript_chunks (
+            recording_id INTEGER NOT NULL,
+            chunk_number INTEGER NOT NULL,
+            chunk_length_in_seconds TEXT,
+            transcribed_text TEXT,
+            PRIMARY KEY (recording_id, chunk_number)
+        );
+    """)
+    return connection
+
+def find_duplicate(fingerprint, duration_ms, index_path=FINGERPRINT_INDEX_PATH):
+    """
+    Look up an already-transcribed recording matching the fingerprint.
+    Returns a dict with recording_id, pk_id, file_name, matching_hashes and match_ratio, or None.
+    """
+    if not fingerprint or not os.path.exists(index_path):
+        return None
+    query_offsets = {}
+    for hash_value, frame_offset in fingerprint:
+        query_offsets.setdefault(hash_value, []).append(frame_offset)
+
+    with _index_lock:
+        connection = _connect(index_path)
+        try:
+            # Only recordings of about the same length can share a transcript.
+            candidates = {
+                row[0]: row for row in connection.execute(
+                    "SELECT recording_id, pk_id, file_name, duration_ms, hash_count FROM recordings WHERE ABS(duration_ms - ?) <= ?",
+                    (duration_ms, DURATION_TOLERANCE_SECONDS * 1000),
+                )
+            }
+            if not candidates:
+                return None
+            votes = Counter()
+            hash_values = list(query_offsets)
+            for start in range(0, len(hash_values), 500):
+                batch = hash_values[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for hash_value, recording_id, frame_offset in connection.execute(
+                        f"SELECT hash, recording_id, frame_offset FROM hashes WHERE hash IN ({placeholders})", batch):
+                    if recording_id in candidates:
+                        # A true match puts many hashes at the same offset between the two files.
+                        for query_offset in query_offsets[hash_value]:
+                            votes[(recording_id, frame_offset - query_offset)] += 1
+        finally:
+            connection.close()
+
+    if not votes:
+        return None
+    (recording_id, _), matching_hashes = votes.most_common(1)[0]
+    match_ratio = matching_hashes / len(fingerprint)
+    if matching_hashes < MIN_MATCHING_HASHES or match_ratio < MIN_MATCH_RATIO:
+        return None
+    _, pk_id, file_name, _, _ = candidates[recording_id]
+    return {'recording_id': recording_id, 'pk_id': pk_id, 'file_name': file_name,
+            'matching_hashes': matching_hashes, 'match_ratio': round(match_ratio, 3)}
+
+def register_recording(fingerprint, duration_ms, transcript_chunks, pk_id=None, file_name=None, index_path=FINGERPRINT_INDEX_PATH):
+    """
+    Store a transcribed recording's fingerprint and its transcript chunks.
+    transcript_chunks is a list of dicts with chunk_number, chunk_length_in_seconds and transcribed_text.
+    Returns the new recording_id.
+    """
+    with _index_lock:
+        connection = _connect(index_path)
+        try:
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO recordings (pk_id, file_name, duration_ms, hash_count, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (pk_id, file_name, duration_ms, len(fingerprint), time.time()),
+                )
+                recording_id = cursor.lastrowid
+                connection.executemany(
+                    "INSERT INTO hashes (hash, recording_id, frame_offset) VALUES (?, ?, ?)",
+                    ((hash_value, recording_id, frame_offset) for hash_value, frame_offset in fingerprint),
+                )
+                connection.executemany(
+                    "INSERT INTO transcript_chunks (recording_id, chunk_number, chunk_length_in_seconds, transcribed_text) VALUES (?, ?, ?, ?)",
+                    ((recording_id, chunk['chunk_number'], str(chunk['chunk_length_in_seconds']), chunk['transcribed_text']) for chunk in transcript_chunks),
+                )
+        finally:
+            connection.close()
+    return recording_id
+
+def load_transcript_chunks(recording_id, index_path=FINGERPRINT_INDEX_PATH):
+    """Return the stored transcript chunks of a recording, in order."""
+    with _index_lock:
+        connection = _connect(index_path)
+        try:
+            rows = connection.execute(
+                "SELECT chunk_number, chunk_length_in_seconds, transcribed_text FROM transcript_chunks WHERE recording_id = ? ORDER BY chunk_number",
+                (recording_id,),
+            ).fetchall()
+        finally:
+            connection.close()
+    return [{'chunk_number': row[0], 'chunk_length_in_seconds': row[1], 'transcribed_text': row[2]} for row in rows]
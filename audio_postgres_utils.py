@@ -1,30 +1,34 @@
 import logging
-import psycopg2
-import psycopg2.extras
 from os import environ, path
-from dotenv import load_dotenv
-from google.cloud import secretmanager
+from google_secret_utils import prefetch_secrets
+
+# psycopg2, dotenv and Secret Manager are imported on first use so that importing
+# this module from the stage scripts does not pay for them up front.
 
 GCP_PROJECT_ID = "kumori-404602"
 
+# Secret Manager IDs for each Postgres credential field.
+POSTGRES_SECRET_IDS = {
+    'host': 'KUMORI_POSTGRES_IP',
+    'dbname': 'KUMORI_POSTGRES_DB_NAME',
+    'user': 'KUMORI_POSTGRES_USERNAME',
+    'password': 'KUMORI_POSTGRES_PASSWORD',
+    'connection_name': 'KUMORI_POSTGRES_CONNECTION_NAME',
+}
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 def load_env_file():
+    from dotenv import load_dotenv
     dotenv_path = path.join(path.dirname(__file__), '.env')
     if path.exists(dotenv_path):
         load_dotenv(dotenv_path)
         return True
     return False
 
-def get_secret_version(project_id, secret_id, version_id="latest"):
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode('UTF-8')
-
 def get_postgres_credentials(gcp_project_id=GCP_PROJECT_ID):
     try:
         if load_env_file():
@@ -40,15 +44,11 @@ def get_postgres_credentials(gcp_project_id=GCP_PROJECT_ID):
     except Exception as env_error:
         logging.warning(f"Failed to load credentials from .env file: {env_error}")
         logging.info("Attempting to load credentials from Google Cloud Secret Manager")
-        return {
-            'host': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_IP'),
-            'dbname': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_DB_NAME'),
-            'user': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_USERNAME'),
-            'password': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_PASSWORD'),
-            'connection_name': get_secret_version(gcp_project_id, 'KUMORI_POSTGRES_CONNECTION_NAME'),
-        }
+        secrets = prefetch_secrets(gcp_project_id, POSTGRES_SECRET_IDS.values())
+        return {field: secrets[secret_id] for field, secret_id in POSTGRES_SECRET_IDS.items()}
 
 def get_db_connection(gcp_project_id=GCP_PROJECT_ID):
+    import psycopg2
     db_credentials = get_postgres_credentials(gcp_project_id)
     is_gcp = environ.get('GAE_ENV', '').startswith('standard')
     
@@ -73,15 +73,18 @@ def get_db_connection(gcp_project_id=GCP_PROJECT_ID):
         return None
 
 def fetch_audio_submissions(gcp_project_id=GCP_PROJECT_ID):
+    import psycopg2.extras
     conn = get_db_connection(gcp_project_id)
     if conn is not None:
         try:
             with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                 query = """
                 SELECT pk_id, audio_url, date_submitted, format, ingest_point, 
-                       email_address, last_updated, completion_boolean, comments, file_size
+                       email_address, last_updated, completion_boolean, comments, file_size,
+                       user_request_of_audio
                 FROM prod_user_audio_submissions
                 WHERE completion_boolean = False
+                ORDER BY file_size DESC NULLS LAST, date_submitted
                 """
                 cur.execute(query)
                 records = cur.fetchall()
@@ -146,4 +149,45 @@ def fetch_user_email_and_request_by_pkid(gcp_project_id=GCP_PROJECT_ID, pk_id=No
             logging.info("Database connection closed.")
     else:
         logging.error("Failed to create a database connection.")
-    return None, None
\ No newline at end of file
+    return None, None
+
+def insert_child_submissions(gcp_project_id=GCP_PROJECT_ID, parent_pk_id=None, children=None):
+    """
+    Create one submission row per (audio_url, comments) in children, copying the parent's user,
+    format, ingest point and request. Returns the new rows in the fetch_audio_submissions shape.
+    """
+    import psycopg2.extras
+    if parent_pk_id is None or not children:
+        return []
+    conn = get_db_connection(gcp_project_id)
+    if conn is None:
+        logging.error("Failed to create a database connection.")
+        return []
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            query = """
+            INSERT INTO prod_user_audio_submissions
+                (audio_url, date_submitted, format, ingest_point, email_address, last_updated,
+                 completion_boolean, comments, file_size, user_request_of_audio)
+            SELECT %s, NOW(), format, ingest_point, email_address, NOW(),
+                   False, %s, NULL, user_request_of_audio
+            FROM prod_user_audio_submissions
+            WHERE pk_id = %s
+            RETURNING pk_id, audio_url, date_submitted, format, ingest_point,
+                      email_address, last_updated, completion_boolean, comments, file_size,
+                      user_request_of_audio
+            """
+            records = []
+            for audio_url, comments in children:
+                cur.execute(query, (audio_url, comments, parent_pk_id))
+                records.append(cur.fetchone())
+            conn.commit()
+            logging.info(f"Created {len(records)} child submissions for pk_id: {parent_pk_id}")
+            return records
+    except Exception as e:
+        logging.error(f"Error creating child submissions for pk_id {parent_pk_id}: {e}")
+        conn.rollback()
+        return []
+    finally:
+        conn.close()
+        logging.info("Database connection closed.")
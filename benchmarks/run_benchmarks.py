@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import importlib
+import subprocess
+import tracemalloc
+import contextlib
+from pathlib import Path
+
+# Offline benchmark harness. Generates synthetic audio, runs each stage's real code
+# against local stand-ins (HTTP file server, stub recognizer, mock OpenAI endpoint,
+# local SMTP, optional local Postgres) and writes a machine-readable report to
+# benchmarks/results/<commit>.json so runs on different commits can be compared.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_audio import generate_fixture_set
+from stub_services import start_file_server, start_mock_openai, start_local_smtp, make_stub_recognizer, InMemorySubmissions
+
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+DEFAULT_DURATIONS_SECONDS = [30, 120, 300]
+QUICK_DURATIONS_SECONDS = [10, 30]
+
+# Environment variables for an optional local Postgres (with a prod_user_audio_submissions table)
+LOCAL_POSTGRES_ENV = {
+    'KUMORI_POSTGRES_IP': 'BENCH_POSTGRES_HOST',
+    'KUMORI_POSTGRES_DB_NAME': 'BENCH_POSTGRES_DBNAME',
+    'KUMORI_POSTGRES_USERNAME': 'BENCH_POSTGRES_USER',
+    'KUMORI_POSTGRES_PASSWORD': 'BENCH_POSTGRES_PASSWORD',
+}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def summarize_latencies(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_seconds': round(sum(ordered) / len(ordered), 4),
+        'p50_seconds': round(ordered[len(ordered) // 2], 4),
+        'p95_seconds': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        'max_seconds': round(ordered[-1], 4),
+    }
+
+def histogram_summary(name):
+    from pipeline_metrics import registry
+    for histogram in registry.to_dict()['histograms']:
+        if histogram['name'] == name:
+            return {key: histogram[key] for key in ('count', 'mean', 'p50', 'p95', 'max')}
+    return {'count': 0}
+
+@contextlib.contextmanager
+def measured(result, verbose=False):
+    """Fill result with wall_seconds and peak_memory_mb (Python allocations) of the with-block."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            yield result
+    finally:
+        result['wall_seconds'] = round(time.perf_counter() - start, 4)
+        result['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+        tracemalloc.stop()
+
+def configure_local_postgres(secrets):
+    """Point the DB helpers at a local Postgres when BENCH_POSTGRES_* is set. Returns True if configured."""
+    if not all(os.environ.get(env_name) for env_name in LOCAL_POSTGRES_ENV.values()):
+        return False
+    import audio_postgres_utils
+    for secret_id, env_name in LOCAL_POSTGRES_ENV.items():
+        secrets[secret_id] = os.environ[env_name]
+    secrets['KUMORI_POSTGRES_CONNECTION_NAME'] = ''
+    # Never pick up the production .env while benchmarking.
+    audio_postgres_utils.load_env_file = lambda: False
+    return True
+
+def seed_local_postgres(fixtures, base_url):
+    from audio_postgres_utils import get_db_connection
+    conn = get_db_connection()
+    with conn, conn.cursor() as cur:
+        for fixture in fixtures:
+            cur.execute(
+                """
+                INSERT INTO prod_user_audio_submissions (pk_id, audio_url, ingest_point, email_address, completion_boolean, file_size)
+                VALUES (%s, %s, 'gdrive', 'bench@example.com', False, %s)
+                ON CONFLICT (pk_id) DO UPDATE SET audio_url = EXCLUDED.audio_url, completion_boolean = False
+                """,
+                (fixture['pk_id'], f"{base_url}/{os.path.basename(fixture['path'])}", os.path.getsize(fixture['path'])),
+            )
+    conn.close()
+
+def bench_download(fixtures, fixture_dir, use_postgres, verbose):
+    stage = importlib.import_module('1_download_audio')
+    server, base_url = start_file_server(fixture_dir)
+    if use_postgres:
+        seed_local_postgres(fixtures, base_url)
+    latencies = []
+    result = {'files': len(fixtures)}
+    try:
+        with measured(result, verbose):
+            stage.ensure_download_folder_exists()
+            if use_postgres:
+                submissions = [(row['audio_url'], row['pk_id']) for row in stage.fetch_audio_submissions() or []]
+            else:
+                submissions = [(f"{base_url}/{os.path.basename(fixture['path'])}", fixture['pk_id']) for fixture in fixtures]
+            for url, pk_id in submissions:
+                start = time.perf_counter()
+                stage.download_and_convert(url, 'gdrive', pk_id, 'bench@example.com')
+                latencies.append(time.perf_counter() - start)
+    finally:
+        server.shutdown()
+    downloaded_bytes = sum(os.path.getsize(path) for path in stage.successful_downloads if os.path.exists(path))
+    result.update({
+        'bytes': downloaded_bytes,
+        'bytes_per_second': round(downloaded_bytes / result['wall_seconds'], 1) if result['wall_seconds'] else None,
+        'failures': len(stage.download_failures),
+        'latency': summarize_latencies(latencies),
+    })
+    return result
+
+def bench_transcribe(recognizer_latency, verbose):
+    stage = importlib.import_module('2_transcribe_audio')
+    stub_recognizer = make_stub_recognizer(latency_seconds=recognizer_latency)
+    stage.get_recognizer = lambda: stub_recognizer
+    os.makedirs(stage.chunking_log_dir, exist_ok=True)
+
+    jobs = stage.collect_transcription_jobs()
+    latencies = []
+    result = {'files': len(jobs)}
+    with measured(result, verbose):
+        total_duration_ms = sum(stage.get_audio_duration_ms(filepath) for filepath, _ in jobs)
+        stage.start_time = time.time()  # process_audio_file reads the script-level start time for its ETA
+        processed_duration_ms = 0
+        for file_number, (filepath, manifest) in enumerate(jobs, start=1):
+            start = time.perf_counter()
+            processed_duration_ms = stage.process_audio_file(filepath, file_number, len(jobs), total_duration_ms, processed_duration_ms, manifest)
+            latencies.append(time.perf_counter() - start)
+    result.update({
+        'audio_seconds': round(total_duration_ms / 1000, 1),
+        'audio_seconds_per_wall_second': round(total_duration_ms / 1000 / result['wall_seconds'], 2) if result['wall_seconds'] else None,
+        'recognizer_latency_setting_seconds': recognizer_latency,
+        'file_latency': summarize_latencies(latencies),
+        'chunk_recognizer_latency': histogram_summary('recognizer_chunk_seconds'),
+        'decode_latency': histogram_summary('audio_decode_seconds'),
+    })
+    return result
+
+def bench_summarize(openai_latency, use_postgres, verbose):
+    openai_server, openai_base_url = start_mock_openai(openai_latency)
+    os.environ['OPENAI_BASE_URL'] = openai_base_url
+    smtp = start_local_smtp()
+    if smtp is not None:
+        os.environ.update(SMTP_HOST='127.0.0.1', SMTP_PORT=str(smtp[2]), SMTP_USE_SSL='false')
+
+    stage = importlib.import_module('3_summarize_with_openai')
+    stage.get_openai_api_key = lambda: 'bench-key'
+    if not use_postgres:
+        submissions = InMemorySubmissions()
+        stage.fetch_user_email_and_request_by_pkid = submissions.fetch_user_email_and_request_by_pkid
+        stage.update_completion_boolean_with_pk_id = submissions.update_completion_boolean_with_pk_id
+    if smtp is None:
+        # Without a local SMTP server, skip sending but keep the packaging work.
+        stage.send_email_with_attachments = lambda *args, **kwargs: None
+
+    chunking_log_dir = Path(stage.CHUNKING_LOG_DIR)
+    jobs = stage.collect_summarization_jobs(chunking_log_dir)
+    latencies = []
+    result = {'files': len(jobs), 'openai_latency_setting_seconds': openai_latency, 'smtp': smtp is not None}
+    try:
+        with measured(result, verbose):
+            for csv_file_path, manifest in jobs:
+                start = time.perf_counter()
+                stage.summarize_csv_file(csv_file_path, manifest, chunking_log_dir)
+                latencies.append(time.perf_counter() - start)
+            flush_start = time.perf_counter()
+            from gmail_utils.gmail_utils import close_mailer
+            close_mailer()
+            result['smtp_flush_seconds'] = round(time.perf_counter() - flush_start, 4)
+    finally:
+        openai_server.shutdown()
+        if smtp is not None:
+            smtp[0].stop()
+    result.update({
+        'file_latency': summarize_latencies(latencies),
+        'openai_latency': histogram_summary('openai_request_seconds'),
+        'smtp_send_latency': histogram_summary('smtp_send_seconds'),
+        'emails_received': smtp[1].message_count if smtp is not None else 0,
+    })
+    return result
+
+def compare_results(current, baseline_path, threshold):
+    with open(baseline_path, 'r', encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = []
+    print(f"\n=== Comparison against {baseline.get('commit')} ===")
+    for stage_name, stage_result in current['stages'].items():
+        previous = baseline.get('stages', {}).get(stage_name)
+        if not previous or 'error' in stage_result or 'error' in previous:
+            continue
+        for key in ('wall_seconds', 'peak_memory_mb'):
+            old, new = previous.get(key), stage_result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            print(f"{stage_name}.{key}: {old} -> {new} ({change:+.1%})")
+            if change > threshold:
+                regressions.append(f"{stage_name}.{key} regressed by {change:.1%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against local stand-ins.")
+    parser.add_argument('--durations', type=float, nargs='+', help="Fixture lengths in seconds.")
+    parser.add_argument('--quick', action='store_true', help=f"Use short fixtures {QUICK_DURATIONS_SECONDS}.")
+    parser.add_argument('--silence-ratio', type=float, default=0.2)
+    parser.add_argument('--recognizer-latency', type=float, default=0.05, help="Stub recognizer delay per chunk, seconds.")
+    parser.add_argument('--openai-latency', type=float, default=0.2, help="Mock OpenAI delay per request, seconds.")
+    parser.add_argument('--stages', nargs='+', default=['download', 'transcribe', 'summarize'])
+    parser.add_argument('--output', help="Result path (default benchmarks/results/<commit>.json).")
+    parser.add_argument('--compare', help="Baseline result file to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative slowdown that counts as a regression.")
+    parser.add_argument('--keep-workspace', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Show the stage scripts' own output.")
+    args = parser.parse_args()
+
+    durations = args.durations or (QUICK_DURATIONS_SECONDS if args.quick else DEFAULT_DURATIONS_SECONDS)
+    workspace = tempfile.mkdtemp(prefix="pipeline_bench_")
+    fixture_dir = os.path.join(workspace, "fixtures")
+    original_cwd = os.getcwd()
+
+    secrets = {'KUMORI_GMAIL_USERNAME': 'bench@example.com', 'KUMORI_GMAIL_APP_PASSWORD': 'bench'}
+    secrets_path = os.path.join(workspace, "secrets.json")
+    os.environ['LOCAL_SECRETS_FILE'] = secrets_path
+    os.environ['PIPELINE_RUN_ID'] = f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'durations_seconds': durations,
+            'silence_ratio': args.silence_ratio,
+            'recognizer_latency_seconds': args.recognizer_latency,
+            'openai_latency_seconds': args.openai_latency,
+        },
+        'stages': {},
+    }
+
+    try:
+        fixtures = generate_fixture_set(fixture_dir, durations, args.silence_ratio)
+        use_postgres = configure_local_postgres(secrets)
+        report['config']['local_postgres'] = use_postgres
+        with open(secrets_path, 'w', encoding='utf-8') as secrets_file:
+            json.dump(secrets, secrets_file)
+
+        os.chdir(workspace)  # The stage scripts use paths relative to the working directory
+        stage_runners = {
+            'download': lambda: bench_download(fixtures, fixture_dir, use_postgres, args.verbose),
+            'transcribe': lambda: bench_transcribe(args.recognizer_latency, args.verbose),
+            'summarize': lambda: bench_summarize(args.openai_latency, use_postgres, args.verbose),
+        }
+        for stage_name in args.stages:
+            print(f"Running {stage_name} benchmark...")
+            try:
+                report['stages'][stage_name] = stage_runners[stage_name]()
+            except ImportError as e:
+                report['stages'][stage_name] = {'error': f"missing dependency: {e}"}
+            print(json.dumps(report['stages'][stage_name], indent=4))
+    finally:
+        os.chdir(original_cwd)
+        if args.keep_workspace:
+            print(f"Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    output_path = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f"\nBenchmark results written to {output_path}")
+
+    if args.compare:
+        regressions = compare_results(report, args.compare, args.threshold)
+        if regressions:
+            print("\n=== Regressions ===")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
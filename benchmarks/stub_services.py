@@ -0,0 +1,155 @@
+import os
+import json
+import socket
+import time
+import random
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler, BaseHTTPRequestHandler
+
+# Local stand-ins for the external services the pipeline talks to, so each stage
+# can be benchmarked without YouTube, Google SR, OpenAI, Gmail or Cloud SQL.
+
+
+class QuietFileHandler(SimpleHTTPRequestHandler):
+    """Static file handler that sends Content-Disposition like Google Drive downloads do."""
+
+    def end_headers(self):
+        if self.command == 'GET' and not self.path.endswith('/'):
+            self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(self.path)}"')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_file_server(directory):
+    """Serve `directory` over HTTP on a free localhost port. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietFileHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /v1/chat/completions with a canned completion after a configurable delay.
+    model_latency_seconds overrides the delay per model; models in failing_models get a 503,
+    so model routing and fallbacks can be exercised locally.
+    """
+    latency_seconds = 0.2
+    model_latency_seconds = {}
+    failing_models = ()
+    request_count = 0
+    requests_by_model = {}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = body.get('model', 'mock-model')
+        time.sleep(self.model_latency_seconds.get(model, self.latency_seconds))
+        type(self).request_count += 1
+        self.requests_by_model[model] = self.requests_by_model.get(model, 0) + 1
+        if model in self.failing_models:
+            payload = json.dumps({'error': {'message': f"{model} is unavailable", 'type': 'server_error'}}).encode('utf-8')
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        prompt_tokens = sum(len(message.get('content', '')) // 4 for message in body.get('messages', []))
+        response = {
+            'id': f"chatcmpl-mock-{type(self).request_count}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'system_fingerprint': 'fp_mock',
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': "- Mock summary bullet one\n- Mock summary bullet two"},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 12, 'total_tokens': prompt_tokens + 12},
+        }
+        payload = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_openai(latency_seconds=0.2, model_latency_seconds=None, failing_models=()):
+    """Start the mock OpenAI endpoint. Returns (server, base_url) for OPENAI_BASE_URL."""
+    handler = type('ConfiguredMockOpenAIHandler', (MockOpenAIHandler,), {
+        'latency_seconds': latency_seconds,
+        'model_latency_seconds': dict(model_latency_seconds or {}),
+        'failing_models': tuple(failing_models),
+        'request_count': 0,
+        'requests_by_model': {},
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def start_local_smtp():
+    """Start an aiosmtpd sink on localhost. Returns (controller, handler, port), or None without aiosmtpd."""
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        return None
+
+    class CountingHandler:
+        def __init__(self):
+            self.message_count = 0
+            self.total_bytes = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            self.message_count += 1
+            self.total_bytes += len(envelope.content)
+            return '250 Message accepted'
+
+    # aiosmtpd cannot bind port 0 itself, so reserve a free port first.
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    return controller, handler, port
+
+
+def make_stub_recognizer(latency_seconds=0.05, jitter_seconds=0.0, failure_rate=0.0, seed=0):
+    """
+    Return a speech_recognition.Recognizer whose recognize_google() sleeps instead of
+    calling Google. Chunks still come from the real PCM cache, so decode cost is kept.
+    """
+    import speech_recognition as sr
+    rng = random.Random(seed)
+
+    class StubRecognizer(sr.Recognizer):
+        def recognize_google(self, audio_data, *args, **kwargs):
+            time.sleep(max(0.0, latency_seconds + rng.uniform(-jitter_seconds, jitter_seconds)))
+            if rng.random() < failure_rate:
+                raise sr.UnknownValueError()
+            seconds = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+            return " ".join(["synthetic"] * max(1, int(seconds * 2)))
+
+    return StubRecognizer()
+
+
+class InMemorySubmissions:
+    """Stand-in for the prod_user_audio_submissions queries when no local Postgres is configured."""
+
+    def __init__(self, email_address='bench@example.com'):
+        self.email_address = email_address
+        self.completed = set()
+
+    def fetch_user_email_and_request_by_pkid(self, gcp_project_id=None, pk_id=None):
+        return self.email_address, None
+
+    def update_completion_boolean_with_pk_id(self, gcp_project_id=None, pk_id=None):
+        self.completed.add(pk_id)
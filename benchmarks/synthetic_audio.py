@@ -0,0 +1,53 @@
+import os
+import math
+import wave
+import array
+import random
+
+# Synthetic audio fixtures for the benchmarks. Files alternate "speech" (a few
+# amplitude-modulated tones, enough for decoders and silence detection to treat
+# as signal) with digital silence, at a controlled total length and silence ratio.
+SAMPLE_RATE = 16000
+SEGMENT_SECONDS = 2.0
+
+def _speech_like_samples(sample_count, rng, amplitude=0.4):
+    base_frequencies = [rng.uniform(120, 300), rng.uniform(600, 1200), rng.uniform(1800, 3000)]
+    samples = array.array('h')
+    for n in range(sample_count):
+        t = n / SAMPLE_RATE
+        envelope = 0.5 * (1 + math.sin(2 * math.pi * 4 * t))  # ~4 Hz syllable rate
+        value = sum(math.sin(2 * math.pi * frequency * t) for frequency in base_frequencies) / len(base_frequencies)
+        samples.append(int(32767 * amplitude * envelope * value))
+    return samples
+
+def generate_audio_fixture(output_path, duration_seconds, silence_ratio=0.2, seed=0):
+    """Write a mono 16-bit WAV of the given length where about silence_ratio of it is silent."""
+    rng = random.Random(seed)
+    segment_samples = int(SEGMENT_SECONDS * SAMPLE_RATE)
+    total_samples = int(duration_seconds * SAMPLE_RATE)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    # Speech segments repeat one pre-rendered block per seed to keep fixture generation fast.
+    speech_block = _speech_like_samples(segment_samples, rng)
+    silence_block = array.array('h', bytes(2 * segment_samples))
+
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        written = 0
+        while written < total_samples:
+            block = silence_block if rng.random() < silence_ratio else speech_block
+            block = block[:total_samples - written]
+            wav_file.writeframes(block.tobytes())
+            written += len(block)
+    return output_path
+
+def generate_fixture_set(output_dir, durations_seconds, silence_ratio=0.2):
+    """Generate one fixture per duration, named like downloaded media (<title>_pkid_<n>.wav)."""
+    fixtures = []
+    for index, duration_seconds in enumerate(durations_seconds, start=1):
+        fixture_path = os.path.join(output_dir, f"synthetic_{int(duration_seconds)}s_pkid_{index}.wav")
+        generate_audio_fixture(fixture_path, duration_seconds, silence_ratio, seed=index)
+        fixtures.append({'pk_id': index, 'path': fixture_path, 'duration_seconds': duration_seconds})
+    return fixtures
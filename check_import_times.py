@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# Stage modules that 0_run_all.py starts in a fresh interpreter on every run.
+STAGE_MODULES = ['1_download_audio', '2_transcribe_audio', '3_summarize_with_openai', 'audio_postgres_utils', 'gmail_utils.gmail_utils']
+
+# Heavy dependencies that must only be imported when they are actually used.
+DEFERRED_MODULES = ['pandas', 'tiktoken', 'openai', 'tqdm', 'yt_dlp', 'psycopg2', 'requests',
+                    'youtube_transcript_api', 'google.cloud.secretmanager', 'speech_recognition', 'pydub', 'dotenv']
+
+# Cumulative import time budget per stage module, in milliseconds.
+DEFAULT_BUDGET_MS = 150
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_time_snapshot.json')
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Function: Import a module in a fresh interpreter with -X importtime and collect timings.
+def measure_import(module_name):
+    # __import__ goes through the C import path, which is what -X importtime reports on.
+    probe = (
+        "import json, sys; "
+        f"__import__({module_name!r}); "
+        f"print(json.dumps(sorted(m for m in {DEFERRED_MODULES!r} if m in sys.modules)))"
+    )
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return {'module': module_name, 'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed'}
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append((name, int(self_us), int(cumulative_us), len(indent)))
+
+    # The stage module itself is the last top-level entry for its own name.
+    total_us = next((cumulative for name, _, cumulative, _ in reversed(timings) if name == module_name), 0)
+    heaviest = sorted(timings, key=lambda t: t[1], reverse=True)[:5]
+    return {
+        'module': module_name,
+        'cumulative_ms': round(total_us / 1000, 2),
+        'heaviest_self_ms': {name: round(self_us / 1000, 2) for name, self_us, _, _ in heaviest},
+        'eager_heavy_imports': json.loads(result.stdout.strip().splitlines()[-1]) if result.stdout.strip() else [],
+    }
+
+# Function: Compare measured import times against the budget and an optional snapshot.
+def check_results(results, budget_ms, snapshot, tolerance):
+    failures = []
+    for entry in results:
+        module_name = entry['module']
+        if 'error' in entry:
+            # A missing third-party package is reported but does not fail the budget check.
+            print(f"{module_name}: could not import ({entry['error']})")
+            continue
+        print(f"{module_name}: {entry['cumulative_ms']:.2f} ms (budget {budget_ms} ms)")
+        if entry['eager_heavy_imports']:
+            failures.append(f"{module_name} imports {', '.join(entry['eager_heavy_imports'])} at import time")
+        if entry['cumulative_ms'] > budget_ms:
+            failures.append(f"{module_name} took {entry['cumulative_ms']:.2f} ms, over the {budget_ms} ms budget")
+        previous = snapshot.get(module_name)
+        if previous and entry['cumulative_ms'] > previous * (1 + tolerance):
+            failures.append(f"{module_name} regressed from {previous:.2f} ms to {entry['cumulative_ms']:.2f} ms")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import-time budget of the stage scripts.")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Allowed relative regression against the snapshot.")
+    parser.add_argument('--update-snapshot', action='store_true', help="Write the measured timings to the snapshot file.")
+    args = parser.parse_args()
+
+    results = [measure_import(module_name) for module_name in STAGE_MODULES]
+
+    snapshot = {}
+    if os.path.exists(SNAPSHOT_FILE) and not args.update_snapshot:
+        with open(SNAPSHOT_FILE, 'r', encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+
+    failures = check_results(results, args.budget_ms, snapshot, args.tolerance)
+
+    if args.update_snapshot:
+        with open(SNAPSHOT_FILE, 'w', encoding='utf-8') as snapshot_file:
+            json.dump({entry['module']: entry['cumulative_ms'] for entry in results if 'error' not in entry}, snapshot_file, indent=4)
+        print(f"Snapshot written to {SNAPSHOT_FILE}")
+
+    if failures:
+        print("\n=== Import Time Check Failed ===")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+    print("\nImport time check passed.")
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,49 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
-from google_secret_utils import get_secret_version
+import sys
+import base64
+import zipfile
+import mimetypes
+import time
+import queue
+import threading
 from os import environ, path
-from dotenv import load_dotenv
+from functools import lru_cache
 import logging
 
+# Use the project-wide cached secret provider from the repository root.
+sys.path.insert(0, path.abspath(path.join(path.dirname(__file__), '..')))
+from google_secret_utils import prefetch_secrets
+from pipeline_metrics import inc, observe, timer
+from pipeline_tracing import span, current_span_context
+
 # Define the project ID and the secret IDs for username and app password
 PROJECT_ID = 'YOURPROJECTID'
 GMAIL_USERNAME_SECRET_ID = 'KUMORI_GMAIL_USERNAME'
 GMAIL_APP_PASSWORD_SECRET_ID = 'KUMORI_GMAIL_APP_PASSWORD'
 
+# SMTP server settings. Point SMTP_HOST/SMTP_PORT at a local stand-in such as
+# `python -m aiosmtpd -n -l localhost:8025` with SMTP_USE_SSL=false for testing.
+SMTP_HOST = environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(environ.get('SMTP_PORT', 465))
+SMTP_USE_SSL = environ.get('SMTP_USE_SSL', 'true').lower() == 'true'
+SMTP_DEBUG_LEVEL = int(environ.get('SMTP_DEBUG_LEVEL', 0))  # 1 dumps the SMTP protocol to stdout
+SMTP_MAX_RETRIES = 3
+SMTP_RETRY_DELAY_SECONDS = 2
+
+# Gmail rejects messages over 25 MB after base64 encoding.
+GMAIL_MAX_MESSAGE_BYTES = 25 * 1024 * 1024
+# Budget for the encoded attachments of one message, leaving headroom for the body and headers.
+ATTACHMENT_BUDGET_BYTES = GMAIL_MAX_MESSAGE_BYTES - 5 * 1024 * 1024
+# Raw bytes read per step when base64-encoding attachments (multiple of 57 so
+# every chunk encodes to whole 76-character lines).
+ATTACHMENT_READ_CHUNK_BYTES = 57 * 1024
+
 # Load environment variables from .env file if it exists
 # Load environment variables from .env file if it exists
 def load_env_file():
+    from dotenv import load_dotenv
     # Assuming the .env file is always in the root of the project directory
     base_dir = path.abspath(path.join(path.dirname(__file__), '..'))
     dotenv_path = path.join(base_dir, '.env')
@@ -25,7 +54,9 @@ def load_env_file():
     return False
 
 
-# Load Gmail credentials
+# Load Gmail credentials. Resolved on the first send rather than at import time,
+# so importing this module never touches .env or Secret Manager.
+@lru_cache(maxsize=None)
 def get_gmail_credentials():
     try:
         if load_env_file():
@@ -38,21 +69,50 @@ def get_gmail_credentials():
     except Exception as env_error:
         logging.warning(f"Failed to load Gmail credentials from .env file: {env_error}")
         logging.info("Attempting to load credentials from Google Cloud Secret Manager")
+        secrets = prefetch_secrets(PROJECT_ID, [GMAIL_USERNAME_SECRET_ID, GMAIL_APP_PASSWORD_SECRET_ID])
         return {
-            'user': get_secret_version(PROJECT_ID, GMAIL_USERNAME_SECRET_ID),
-            'password': get_secret_version(PROJECT_ID, GMAIL_APP_PASSWORD_SECRET_ID),
+            'user': secrets[GMAIL_USERNAME_SECRET_ID],
+            'password': secrets[GMAIL_APP_PASSWORD_SECRET_ID],
         }
 
-# Retrieve the Gmail credentials
-gmail_credentials = get_gmail_credentials()
-GMAIL_USER = gmail_credentials['user']
-GMAIL_PASSWORD = gmail_credentials['password']
+# Function to estimate the on-the-wire size of a file once base64-encoded into an email
+def encoded_attachment_size(attachment_path):
+    raw_size = path.getsize(attachment_path)
+    encoded_size = -(-raw_size // 3) * 4
+    return encoded_size + encoded_size // 76 + 1  # newline after every 76-character line
+
+# Function to compress files into a single zip archive, streaming each file from disk
+def package_attachments(attachment_paths, archive_path):
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        for attachment_path in attachment_paths:
+            archive.write(attachment_path, arcname=path.basename(attachment_path))
+    return archive_path
+
+# Function to build a base64 MIME part from a file without holding the raw and
+# encoded copies of the whole file in memory at the same time
+def encode_attachment(attachment_path):
+    content_type, _ = mimetypes.guess_type(attachment_path)
+    maintype, subtype = (content_type or 'application/octet-stream').split('/', 1)
+    part = MIMEBase(maintype, subtype)
+
+    encoded_chunks = []
+    with open(attachment_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(ATTACHMENT_READ_CHUNK_BYTES), b''):
+            encoded_chunks.append(base64.encodebytes(chunk).decode('ascii'))
+    part.set_payload(''.join(encoded_chunks))
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header(
+        'Content-Disposition',
+        'attachment',
+        filename=path.basename(attachment_path)
+    )
+    return part
 
-# Function to send emails
-def send_email(subject, body, to_emails, attachment_paths=None, is_html=False):
+# Function to build an email message with optional attachments
+def build_message(subject, body, to_emails, attachment_paths=None, is_html=False, sender=None):
     # Setup email headers and recipients
     message = MIMEMultipart()
-    message['From'] = 'Kumori.ai <{}>'.format(GMAIL_USER)
+    message['From'] = 'Kumori.ai <{}>'.format(sender or get_gmail_credentials()['user'])
     message['To'] = ', '.join(to_emails)
     message['Subject'] = subject
 
@@ -64,23 +124,150 @@ def send_email(subject, body, to_emails, attachment_paths=None, is_html=False):
     # Process attachments if any
     if attachment_paths:
         for attachment_path in attachment_paths:
-            part = MIMEBase('application', 'octet-stream')
-            with open(attachment_path, 'rb') as file:
-                part.set_payload(file.read())
-            encoders.encode_base64(part)
-            part.add_header(
-                'Content-Disposition',
-                'attachment',
-                filename=path.basename(attachment_path)
-            )
-            message.attach(part)
-        
-    # Connect to Gmail SMTP server and send email
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-        server.set_debuglevel(1)  # Enable debug output to console
-        server.login(GMAIL_USER, GMAIL_PASSWORD)
-        server.send_message(message)
+            message.attach(encode_attachment(attachment_path))
+    return message
+
+
+class SMTPMailer:
+    """Reuses one authenticated SMTP connection for a batch of messages.
+
+    send_message() sends synchronously; enqueue() hands the message to a background
+    thread that drains the queue. Both reconnect and retry when the server drops the
+    connection. close() waits for queued messages and logs out.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_USE_SSL, credentials=None,
+                 max_retries=SMTP_MAX_RETRIES, retry_delay=SMTP_RETRY_DELAY_SECONDS):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.credentials = credentials
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.sent_count = 0
+        self.failures = []
+        self._server = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        with timer('smtp_connect_seconds', help="SMTP connect, TLS handshake and login time."):
+            server = smtp_class(self.host, self.port, timeout=60)
+            server.set_debuglevel(SMTP_DEBUG_LEVEL)
+            server.ehlo()
+            # Local stand-ins such as aiosmtpd do not offer AUTH; Gmail always does.
+            if server.has_extn('auth'):
+                credentials = self.credentials or get_gmail_credentials()
+                server.login(credentials['user'], credentials['password'])
+        self._server = server
+        logging.info(f"Connected to SMTP server {self.host}:{self.port}")
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:  # smtplib.SMTPException is an OSError subclass
+                self._server.close()  # quit() skips closing the socket when the connection is already gone
+            self._server = None
+
+    def send_message(self, message):
+        with self._lock:
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    if self._server is None:
+                        self._connect()
+                    send_start = time.perf_counter()
+                    self._server.send_message(message)
+                    observe('smtp_send_seconds', time.perf_counter() - send_start, help="Time to transmit one email.")
+                    inc('emails_total', help="Emails handed to the SMTP server.", result='success')
+                    self.sent_count += 1
+                    return
+                except OSError as e:
+                    # Protocol errors (bad recipient, auth failure) will not succeed on retry.
+                    if isinstance(e, smtplib.SMTPException) and not isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+                        raise
+                    # Connection dropped (idle timeout, network blip); reconnect and try again.
+                    logging.warning(f"SMTP send attempt {attempt}/{self.max_retries} failed: {e}")
+                    self._disconnect()
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(self.retry_delay * attempt)
+
+    def enqueue(self, message):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._drain_queue, name='smtp-mailer', daemon=True)
+            self._worker.start()
+        # Carry the caller's trace context so the background send joins the job's trace.
+        self._queue.put((message, current_span_context()))
+
+    def _drain_queue(self):
+        while True:
+            item = self._queue.get()
+            message = item[0] if item is not None else None
+            try:
+                if message is None:
+                    return
+                with span('smtp.send', parent=item[1], recipients=message['To']):
+                    self.send_message(message)
+                print(f"Email sent successfully to {message['To']}")
+            except Exception as e:
+                logging.error(f"Failed to send email to {message['To']}: {e}")
+                inc('emails_total', help="Emails handed to the SMTP server.", result='failure')
+                self.failures.append((message['To'], str(e)))
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued message has been sent or has failed."""
+        self._queue.join()
+        return self.failures
+
+    def close(self):
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self._worker = None
+        with self._lock:
+            self._disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Process-wide mailer shared by every send_email call
+_shared_mailer = None
+
+def get_mailer():
+    global _shared_mailer
+    if _shared_mailer is None:
+        _shared_mailer = SMTPMailer()
+    return _shared_mailer
+
+def close_mailer():
+    """Flush queued emails, close the shared connection and return any failures."""
+    global _shared_mailer
+    if _shared_mailer is None:
+        return []
+    mailer, _shared_mailer = _shared_mailer, None
+    mailer.close()
+    print(f"Mailer closed after sending {mailer.sent_count} email(s) with {len(mailer.failures)} failure(s)")
+    return mailer.failures
+
+# Function to send emails. With wait=False the message is queued on the shared
+# mailer and sent in the background; call close_mailer() at the end of the batch.
+def send_email(subject, body, to_emails, attachment_paths=None, is_html=False, wait=True):
+    message = build_message(subject, body, to_emails, attachment_paths, is_html)
+    mailer = get_mailer()
+    if wait:
+        mailer.send_message(message)
         print('Email sent successfully')
+    else:
+        mailer.enqueue(message)
 
 # Function to create a sample text file
 def create_sample_text_file(filename, content):
@@ -104,4 +291,5 @@ if __name__ == '__main__':
     attachment_path = path.join(path.getcwd(), filename)
     attachment_paths = [attachment_path]
 
-    send_email(subject, body, to_emails, attachment_paths)
\ No newline at end of file
+    send_email(subject, body, to_emails, attachment_paths)
+    close_mailer()
\ No newline at end of file
@@ -1,7 +1,74 @@
-from google.cloud import secretmanager
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared secret provider for every module in the project. One Secret Manager
+# client is created per process and resolved values are cached in memory for
+# SECRET_CACHE_TTL_SECONDS, so repeated DB connections and emails do not each
+# pay for a fresh client and one RPC per secret.
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', 900))
+
+# Point LOCAL_SECRETS_FILE at a JSON file of {"SECRET_ID": "value"} to resolve
+# secrets locally (tests, benchmarks, offline development) instead of from GCP.
+LOCAL_SECRETS_FILE_ENV = 'LOCAL_SECRETS_FILE'
+
+_client = None
+_client_lock = threading.Lock()
+_cache = {}
+_cache_lock = threading.Lock()
+
+def get_secret_client():
+    """Return the process-wide SecretManagerServiceClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google.cloud import secretmanager  # Imported lazily; only needed when .env is missing
+            _client = secretmanager.SecretManagerServiceClient()
+        return _client
+
+def _load_local_secrets(secrets_file):
+    with open(secrets_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _fetch_secret(project_id, secret_id, version_id):
+    secrets_file = os.environ.get(LOCAL_SECRETS_FILE_ENV)
+    if secrets_file:
+        local_secrets = _load_local_secrets(secrets_file)
+        if secret_id not in local_secrets:
+            raise KeyError(f"Secret {secret_id} not found in {secrets_file}")
+        return local_secrets[secret_id]
 
-def get_secret_version(project_id, secret_id, version_id="latest"):
-    client = secretmanager.SecretManagerServiceClient()
     name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode('UTF-8')
\ No newline at end of file
+    response = get_secret_client().access_secret_version(request={"name": name})
+    return response.payload.data.decode('UTF-8')
+
+def get_secret_version(project_id, secret_id, version_id="latest", ttl=SECRET_CACHE_TTL_SECONDS):
+    key = (project_id, secret_id, version_id)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    value = _fetch_secret(project_id, secret_id, version_id)
+    with _cache_lock:
+        _cache[key] = (value, now + ttl)
+    return value
+
+def prefetch_secrets(project_id, secret_ids, version_id="latest", max_workers=8):
+    """Resolve several secrets concurrently and warm the cache. Returns {secret_id: value}."""
+    secret_ids = list(dict.fromkeys(secret_ids))
+    if not secret_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(secret_ids))) as executor:
+        values = executor.map(lambda secret_id: get_secret_version(project_id, secret_id, version_id), secret_ids)
+        secrets = dict(zip(secret_ids, values))
+    logging.info(f"Prefetched {len(secrets)} secrets from {'local file' if os.environ.get(LOCAL_SECRETS_FILE_ENV) else 'Secret Manager'}")
+    return secrets
+
+def clear_secret_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,150 @@
+import csv
+import os
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline_metrics import inc
+
+# Incremental summarization for 3_summarize_with_openai.py --follow. While
+# 2_transcribe_audio.py is still appending chunks to a job's transcription log,
+# TranscriptLogFollower picks up each new row and RollingSummarizer summarizes
+# every window of PARTIAL_SUMMARY_WINDOW_TOKENS as soon as it fills, in the
+# background. When the last chunk lands only the tail window and a short reduce
+# over the partial summaries remain, instead of one completion over the whole
+# transcript. Transcripts shorter than one window get the usual single completion.
+
+PARTIAL_SUMMARY_WINDOW_TOKENS = 8000
+PARTIAL_SUMMARY_WORKERS = 4
+
+PARTIAL_SUMMARY_PROMPT = """You are summarizing part {part_number} of a longer transcript that is still being transcribed.
+Write concise bullet points covering everything in this part that could matter for the request below.
+Do not answer the request yet; your notes will be combined with the notes for the other parts.
+
+Request:
+{prompt}"""
+
+FINAL_REDUCE_INTRO = "The transcript was too long to send at once, so it was summarized in consecutive parts. These are the notes for each part, in order:"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Shared pool for partial summaries of all followed jobs."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PARTIAL_SUMMARY_WORKERS, thread_name_prefix='partial-summary')
+        return _executor
+
+
+class TranscriptLogFollower:
+    """Reads the transcribed_text of rows appended to a transcription log CSV since the last call."""
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.offset = 0
+        self.fieldnames = None
+
+    def read_new_texts(self):
+        if not self.csv_path or not os.path.exists(self.csv_path):
+            return []
+        with open(self.csv_path, 'rb') as csv_file:
+            csv_file.seek(self.offset)
+            data = csv_file.read()
+        # Only complete records are consumed. A quoted field can span lines (caption transcripts are one field
+        # with a line per segment), so a record still being written may end in the middle of a quote.
+        lines = [line + b'\n' for line in data.split(b'\n')[:-1]]
+        fed_bytes = 0
+        exhausted = False
+
+        def feed():
+            nonlocal fed_bytes, exhausted
+            for line in lines:
+                fed_bytes += len(line)
+                yield line.decode('utf-8')
+            exhausted = True
+
+        consumed = 0
+        texts = []
+        for row in csv.reader(feed()):
+            if exhausted:
+                break  # The reader ran out of lines inside a record; it is picked up next time.
+            consumed = fed_bytes
+            if self.fieldnames is None:
+                self.fieldnames = row
+                continue
+            record = dict(zip(self.fieldnames, row))
+            if record.get('transcribed_text'):
+                texts.append(record['transcribed_text'])
+        self.offset += consumed
+        return texts
+
+
+class RollingSummarizer:
+    """
+    Builds partial summaries over token windows while text arrives, then reduces them.
+    complete_fn(messages, label) returns an OpenAI response dict; count_tokens(text) returns an int.
+    """
+
+    def __init__(self, prompt, label, complete_fn, count_tokens, window_tokens=PARTIAL_SUMMARY_WINDOW_TOKENS):
+        self.prompt = prompt
+        self.label = label
+        self.complete_fn = complete_fn
+        self.count_tokens = count_tokens
+        self.window_tokens = window_tokens
+        self.texts = []
+        self.pending = []
+        self.pending_tokens = 0
+        self.partials = []
+
+    def add_text(self, text):
+        self.texts.append(text)
+        self.pending.append(text)
+        self.pending_tokens += self.count_tokens(text)
+        if self.pending_tokens >= self.window_tokens:
+            self._submit_window()
+
+    def _submit_window(self):
+        part_number = len(self.partials) + 1
+        messages = [{"role": "system", "content": PARTIAL_SUMMARY_PROMPT.format(part_number=part_number, prompt=self.prompt)},
+                    {"role": "user", "content": ' '.join(self.pending)}]
+        # Run in the caller's context so the request's span joins the job's trace.
+        context = contextvars.copy_context()
+        self.partials.append(get_executor().submit(context.run, self.complete_fn, messages, f"{self.label} (part {part_number})"))
+        inc('partial_summaries_total', help="Partial summaries requested while transcription was still running.")
+        self.pending = []
+        self.pending_tokens = 0
+
+    def finish(self, prompt=None, complete_text=None):
+        """
+        Return the final response. With no partial summaries this is one completion over the whole text.
+        The returned usage covers the partial summaries and the final reduce.
+        """
+        prompt = prompt or self.prompt
+        complete_text = complete_text if complete_text is not None else ' '.join(self.texts)
+        if not self.partials:
+            return self.complete_fn([{"role": "system", "content": prompt}, {"role": "user", "content": complete_text}], self.label)
+
+        if self.pending:
+            self._submit_window()
+        try:
+            partial_responses = [future.result() for future in self.partials]
+        except Exception as e:
+            logging.error(f"Partial summary failed for {self.label}, summarizing the full transcript instead: {e}")
+            return self.complete_fn([{"role": "system", "content": prompt}, {"role": "user", "content": complete_text}], self.label)
+
+        notes = "\n\n".join(
+            f"Part {number}:\n{response['choices'][0]['message']['content']}"
+            for number, response in enumerate(partial_responses, start=1)
+        )
+        response_data = self.complete_fn([{"role": "system", "content": prompt},
+                                          {"role": "user", "content": f"{FINAL_REDUCE_INTRO}\n\n{notes}"}], self.label)
+        usage = dict(response_data.get('usage') or {})
+        for partial in partial_responses:
+            for key, value in (partial.get('usage') or {}).items():
+                if isinstance(value, int):
+                    usage[key] = usage.get(key, 0) + value
+        response_data['usage'] = usage
+        return response_data
@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import datetime
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates are only serialized within one process
+    fcntl = None
+
+# Per-job manifests written and read by every stage. Each submission gets one
+# JSON file, jobs/pkid_<pk_id>.json, that records its source, artifact paths,
+# durations, chunk stats and summary IDs, so later stages look a job up directly
+# instead of regexing filenames and globbing the download/transcribe folders.
+JOBS_DIR = "jobs"
+
+# Updates are read-modify-write. The thread lock serializes the workers of one stage;
+# a flock on jobs/pkid_<pk_id>.json.lock serializes stages running side by side
+# (0_run_all.py --stream), so one process never overwrites another's update.
+_manifest_lock = threading.Lock()
+
+def manifest_path(pk_id):
+    return os.path.join(JOBS_DIR, f"pkid_{pk_id}.json")
+
+def load_manifest(pk_id):
+    """Return the manifest for pk_id, or None if the job has no manifest."""
+    try:
+        with open(manifest_path(pk_id), 'r', encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+
+def _write_manifest(manifest):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    target_path = manifest_path(manifest['pk_id'])
+    temp_path = f"{target_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4, default=str)
+    os.replace(temp_path, target_path)  # Atomic, so a concurrent reader never sees a partial file
+
+@contextmanager
+def _locked_manifest(pk_id):
+    with _manifest_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        with open(f"{manifest_path(pk_id)}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def update_manifest(pk_id, artifacts=None, **fields):
+    """Merge fields (and artifact paths) into the manifest for pk_id, creating it if needed."""
+    with _locked_manifest(pk_id):
+        manifest = load_manifest(pk_id) or {'pk_id': pk_id, 'created_at': datetime.datetime.now().isoformat(), 'artifacts': {}}
+        manifest.update(fields)
+        if artifacts:
+            manifest['artifacts'].update(artifacts)
+        manifest['updated_at'] = datetime.datetime.now().isoformat()
+        _write_manifest(manifest)
+        return manifest
+
+def get_artifact(manifest, kind):
+    """Return the artifact path of the given kind if it is recorded and still on disk."""
+    artifact_path = (manifest or {}).get('artifacts', {}).get(kind)
+    if artifact_path and os.path.exists(artifact_path):
+        return artifact_path
+    return None
+
+def list_manifests(status=None):
+    """Return all manifests (optionally only those with the given status), ordered by pk_id."""
+    if not os.path.exists(JOBS_DIR):
+        return []
+    manifests = []
+    for filename in os.listdir(JOBS_DIR):
+        if filename.startswith("pkid_") and filename.endswith(".json"):
+            with open(os.path.join(JOBS_DIR, filename), 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+            if status is None or manifest.get('status') == status:
+                manifests.append(manifest)
+    return sorted(manifests, key=lambda manifest: int(manifest['pk_id']))
+
+def clear_jobs_folder():
+    """Delete all manifests from the previous run."""
+    if os.path.exists(JOBS_DIR):
+        shutil.rmtree(JOBS_DIR, ignore_errors=True)
+        print(f"Cleared the '{JOBS_DIR}' folder.")
+    os.makedirs(JOBS_DIR, exist_ok=True)
+
+# Stage markers, jobs/<stage>.finished, let a stage running alongside another
+# (3_summarize_with_openai.py --follow next to 2_transcribe_audio.py) know when it is done.
+def _stage_marker_path(stage):
+    return os.path.join(JOBS_DIR, f"{stage}.finished")
+
+def mark_stage_finished(stage):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(_stage_marker_path(stage), 'w', encoding='utf-8') as marker_file:
+        marker_file.write(datetime.datetime.now().isoformat())
+
+def clear_stage_finished(stage):
+    if os.path.exists(_stage_marker_path(stage)):
+        os.remove(_stage_marker_path(stage))
+
+def stage_finished(stage):
+    return os.path.exists(_stage_marker_path(stage))
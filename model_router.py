@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from pipeline_metrics import inc
+
+# Picks the OpenAI model for each summary request instead of sending everything
+# to one model. Each entry of the model table has a context limit, prices, a
+# quality tier and a latency prior. A request needs a minimum quality tier: short
+# transcripts with the default prompt need the least, long transcripts and custom
+# prompts need more. Among the models that fit, the smallest adequate one wins
+# unless it misses the latency or cost target, judged from the latency actually
+# observed for each model (persisted across runs). The remaining candidates are
+# kept in order as fallbacks when a request fails.
+#
+# Settings (environment):
+#   MODEL_ROUTING_TABLE             JSON file with a list of model entries replacing DEFAULT_MODEL_TABLE
+#   SUMMARY_MODEL                   pin one model and skip routing
+#   SUMMARY_LATENCY_TARGET_SECONDS  prefer models predicted to answer within this time
+#   SUMMARY_COST_TARGET_DOLLARS     prefer models estimated to cost at most this per request
+
+DEFAULT_MODEL_TABLE = [
+    {'model': 'gpt-4o-mini', 'context_limit': 128000, 'input_cost_per_million': 0.15, 'output_cost_per_million': 0.60, 'quality': 1, 'prior_seconds_per_1k_tokens': 0.4},
+    {'model': 'gpt-4o', 'context_limit': 128000, 'input_cost_per_million': 2.50, 'output_cost_per_million': 10.00, 'quality': 2, 'prior_seconds_per_1k_tokens': 0.8},
+    {'model': 'gpt-4-turbo', 'context_limit': 128000, 'input_cost_per_million': 10.00, 'output_cost_per_million': 30.00, 'quality': 3, 'prior_seconds_per_1k_tokens': 1.5},
+]
+
+SHORT_TRANSCRIPT_TOKENS = 4000  # Default-prompt transcripts up to this size can use the smallest tier
+LONG_TRANSCRIPT_TOKENS = 60000  # Above this, use the most capable tier
+CUSTOM_PROMPT_MIN_QUALITY = 2
+OUTPUT_TOKEN_RESERVE = 4096  # Room left in the context window for the answer
+EXPECTED_OUTPUT_RATIO = 0.1  # Completion tokens as a share of prompt tokens, for cost estimates
+
+LATENCY_STATS_PATH = os.path.join("metrics", "model_latency.json")
+LATENCY_SMOOTHING = 0.3  # Weight of the newest observation in the moving average
+
+_latency_lock = threading.Lock()
+_latency_stats = None
+
+
+def load_model_table():
+    table_path = os.environ.get('MODEL_ROUTING_TABLE')
+    if table_path:
+        with open(table_path, 'r', encoding='utf-8') as table_file:
+            return json.load(table_file)
+    return DEFAULT_MODEL_TABLE
+
+def get_model_entry(model, table=None):
+    """Table entry for a model name as returned by the API (e.g. 'gpt-4o-2024-08-06'), or None."""
+    matches = [entry for entry in (table or load_model_table()) if model == entry['model'] or model.startswith(f"{entry['model']}-")]
+    return max(matches, key=lambda entry: len(entry['model'])) if matches else None
+
+def estimate_cost(entry, prompt_tokens, completion_tokens=None):
+    if completion_tokens is None:
+        completion_tokens = prompt_tokens * EXPECTED_OUTPUT_RATIO
+    return (prompt_tokens * entry['input_cost_per_million'] + completion_tokens * entry['output_cost_per_million']) / 1_000_000
+
+def _load_latency_stats():
+    global _latency_stats
+    if _latency_stats is None:
+        try:
+            with open(LATENCY_STATS_PATH, 'r', encoding='utf-8') as stats_file:
+                _latency_stats = json.load(stats_file)
+        except (FileNotFoundError, ValueError):
+            _latency_stats = {}
+    return _latency_stats
+
+def predict_latency_seconds(entry, token_count):
+    """Predicted request time from the observed seconds per 1k prompt tokens, or the table prior."""
+    with _latency_lock:
+        observed = _load_latency_stats().get(entry['model'], {}).get('seconds_per_1k_tokens')
+    seconds_per_1k_tokens = observed if observed is not None else entry['prior_seconds_per_1k_tokens']
+    return seconds_per_1k_tokens * max(1.0, token_count / 1000)
+
+def record_latency(model, seconds, token_count):
+    """Fold one request's latency into the model's moving average and persist it."""
+    sample = seconds / max(1.0, token_count / 1000)
+    with _latency_lock:
+        stats = _load_latency_stats()
+        model_stats = stats.setdefault(model, {'requests': 0})
+        previous = model_stats.get('seconds_per_1k_tokens')
+        model_stats['seconds_per_1k_tokens'] = sample if previous is None else (1 - LATENCY_SMOOTHING) * previous + LATENCY_SMOOTHING * sample
+        model_stats['requests'] += 1
+        os.makedirs(os.path.dirname(LATENCY_STATS_PATH), exist_ok=True)
+        temp_path = f"{LATENCY_STATS_PATH}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as stats_file:
+            json.dump(stats, stats_file, indent=4)
+        os.replace(temp_path, LATENCY_STATS_PATH)
+
+def required_quality(token_count, custom_prompt=False):
+    if token_count > LONG_TRANSCRIPT_TOKENS:
+        return 3
+    quality = 1 if token_count <= SHORT_TRANSCRIPT_TOKENS else 2
+    return max(quality, CUSTOM_PROMPT_MIN_QUALITY) if custom_prompt else quality
+
+def _env_float(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+def route_models(token_count, custom_prompt=False):
+    """
+    Return the candidate table entries for a request, best first; later entries are fallbacks.
+    Models whose context window cannot hold the request are never returned.
+    """
+    table = load_model_table()
+    pinned = os.environ.get('SUMMARY_MODEL')
+    if pinned:
+        return [get_model_entry(pinned, table) or {**table[-1], 'model': pinned}]
+
+    fitting = [entry for entry in table if token_count + OUTPUT_TOKEN_RESERVE <= entry['context_limit']]
+    if not fitting:
+        # Nothing holds it; send it to the largest window and let the API report the overflow.
+        return [max(table, key=lambda entry: entry['context_limit'])]
+
+    minimum_quality = min(required_quality(token_count, custom_prompt), max(entry['quality'] for entry in fitting))
+    latency_target = _env_float('SUMMARY_LATENCY_TARGET_SECONDS')
+    cost_target = _env_float('SUMMARY_COST_TARGET_DOLLARS')
+
+    def rank(entry):
+        misses_target = ((latency_target is not None and predict_latency_seconds(entry, token_count) > latency_target)
+                         or (cost_target is not None and estimate_cost(entry, token_count) > cost_target))
+        return (entry['quality'] < minimum_quality, misses_target, entry['quality'], predict_latency_seconds(entry, token_count))
+
+    # Under-qualified models stay at the end as a last resort for fallbacks.
+    return sorted(fitting, key=rank)
+
+def complete_with_fallback(request_fn, candidates, token_count):
+    """
+    Call request_fn(model) for each candidate until one succeeds, recording its latency.
+    Re-raises the last error when every candidate fails.
+    """
+    last_error = None
+    for attempt, entry in enumerate(candidates):
+        start = time.perf_counter()
+        try:
+            response_data = request_fn(entry['model'])
+        except Exception as e:
+            last_error = e
+            inc('model_fallbacks_total', help="Summary requests retried on the next routed model.", model=entry['model'])
+            logging.warning(f"Model {entry['model']} failed ({e}); {'trying ' + candidates[attempt + 1]['model'] if attempt + 1 < len(candidates) else 'no fallbacks left'}")
+            continue
+        record_latency(entry['model'], time.perf_counter() - start, token_count)
+        inc('model_routed_requests_total', help="Summary requests by the model that answered.", model=entry['model'], fallback=str(attempt > 0).lower())
+        return response_data
+    raise last_error
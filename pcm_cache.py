@@ -0,0 +1,132 @@
+import os
+import mmap
+import hashlib
+import logging
+import threading
+import subprocess
+
+from pipeline_metrics import timer
+from workspace_manager import reserve, files_bytes, WORKSPACE_WAIT_SECONDS
+
+# Decode-once audio cache. Each input is decoded by ffmpeg a single time, straight
+# to headerless mono 16-bit PCM in download/pcm/, and every consumer (duration
+# probe, fingerprinting, chunking for the recognizer) reads slices of that file
+# through a memory map instead of decoding again. The OS page cache shares the
+# mapped pages between worker threads and processes, so a file is held in RAM once.
+#
+# The cache lives inside the download folder, so 1_download_audio.py clears it
+# together with the media at the start of each run. With workspace_manager's eager
+# cleanup, a job's decode is deleted as soon as its transcript is stored.
+
+PCM_CACHE_DIR = os.path.join("download", "pcm")
+PCM_SAMPLE_RATE = 16000
+PCM_SAMPLE_WIDTH = 2  # bytes, signed 16-bit little-endian
+PCM_CHANNELS = 1
+PCM_BYTES_PER_SECOND = PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH * PCM_CHANNELS
+
+_decode_locks = {}
+_decode_locks_guard = threading.Lock()
+
+
+class PcmAudio:
+    """A decoded input file, memory-mapped read-only. Slices are views into the mapping, not copies."""
+
+    def __init__(self, source_path, raw_path):
+        self.source_path = source_path
+        self.raw_path = raw_path
+        self.byte_count = os.path.getsize(raw_path)
+        self.frame_count = self.byte_count // PCM_SAMPLE_WIDTH
+        self.sample_rate = PCM_SAMPLE_RATE
+        self.sample_width = PCM_SAMPLE_WIDTH
+        self._file = None
+        self._mmap = None
+
+    @property
+    def duration_ms(self):
+        return self.frame_count * 1000 // PCM_SAMPLE_RATE
+
+    def __len__(self):
+        """Length in milliseconds, like a pydub AudioSegment."""
+        return self.duration_ms
+
+    def _mapping(self):
+        if self._mmap is None:
+            self._file = open(self.raw_path, 'rb')
+            # An empty file cannot be mapped; slicing b'' behaves the same for callers.
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.byte_count else b''
+        return self._mmap
+
+    def frame_bytes(self, start_ms, end_ms):
+        """Raw PCM for [start_ms, end_ms) as a zero-copy memoryview."""
+        start = min(self.byte_count, start_ms * PCM_SAMPLE_RATE // 1000 * PCM_SAMPLE_WIDTH)
+        end = min(self.byte_count, end_ms * PCM_SAMPLE_RATE // 1000 * PCM_SAMPLE_WIDTH)
+        return memoryview(self._mapping())[start:end]
+
+    def samples(self):
+        """All samples as a read-only int16 numpy.memmap (requires numpy)."""
+        import numpy as np
+        return np.memmap(self.raw_path, dtype='<i2', mode='r', shape=(self.frame_count,)) if self.frame_count else np.zeros(0, dtype='<i2')
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A caller still holds a slice; the mapping is released when it is garbage collected.
+                return
+        if self._file is not None:
+            self._file.close()
+        self._mmap = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def cache_path(source_path):
+    """Cache file for a source, keyed by its path, size and modification time."""
+    stat = os.stat(source_path)
+    key = f"{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    base_name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(PCM_CACHE_DIR, f"{base_name}_{digest}_{PCM_SAMPLE_RATE}hz_s16le.raw")
+
+def _decode_lock(raw_path):
+    with _decode_locks_guard:
+        return _decode_locks.setdefault(raw_path, threading.Lock())
+
+def _ffmpeg_binary():
+    from pydub import AudioSegment
+    return AudioSegment.converter  # The ffmpeg pydub was configured with
+
+def decode_to_pcm(source_path, duration_seconds=None, reserve_timeout=WORKSPACE_WAIT_SECONDS):
+    """
+    Decode source_path into the cache if it is not there yet, and return its PcmAudio.
+    The decode first reserves its expected size in the workspace (from duration_seconds, else the source
+    size), waiting up to reserve_timeout seconds; workspace_manager.WorkspaceFull is raised if it never fits.
+    """
+    raw_path = cache_path(source_path)
+    with _decode_lock(raw_path):
+        if not os.path.exists(raw_path):
+            expected_bytes = int(duration_seconds * PCM_BYTES_PER_SECOND) if duration_seconds else os.path.getsize(source_path)
+            os.makedirs(PCM_CACHE_DIR, exist_ok=True)
+            partial_path = f"{raw_path}.{os.getpid()}.partial"
+            command = [
+                _ffmpeg_binary(), '-nostdin', '-v', 'error', '-y', '-i', source_path,
+                '-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', str(PCM_CHANNELS), '-ar', str(PCM_SAMPLE_RATE),
+                partial_path,
+            ]
+            with reserve(expected_bytes, label=os.path.basename(source_path), timeout=reserve_timeout,
+                         written_bytes=lambda: files_bytes([partial_path])), \
+                    timer('audio_decode_seconds', help="Time to decode an input file for chunking."):
+                result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise RuntimeError(f"ffmpeg could not decode {source_path}: {result.stderr.decode('utf-8', 'replace').strip()}")
+            os.replace(partial_path, raw_path)
+            logging.info(f"Decoded {source_path} to {raw_path}")
+    return PcmAudio(source_path, raw_path)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+
+# Metrics shared by all three stage scripts. Each stage records counters, gauges and
+# latency histograms into the process-wide registry and calls export_stage_metrics()
+# on exit, which writes metrics/<run_id>/<stage>.prom (Prometheus text format) and
+# <stage>.json. 0_run_all.py merges the stage files into run_report.json.
+METRICS_DIR = "metrics"
+RUN_ID_ENV = 'PIPELINE_RUN_ID'
+
+# Histogram bucket upper bounds in seconds, covering a fast HTTP call up to a long download.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def get_run_id():
+    """Return the run id shared by all stages of one pipeline run (set by 0_run_all.py)."""
+    run_id = os.environ.get(RUN_ID_ENV)
+    if not run_id:
+        run_id = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        os.environ[RUN_ID_ENV] = run_id
+    return run_id
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(label_key, extra=None):
+    pairs = list(label_key) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """In-process store of counters, gauges and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self.started_at = time.time()
+
+    def inc(self, name, value=1, help=None, **labels):
+        with self._lock:
+            if help:
+                self._help[name] = help
+            key = (name, _label_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, help=None, **labels):
+        with self._lock:
+            if help:
+                self._help[name] = help
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, help=None, **labels):
+        with self._lock:
+            if help:
+                self._help[name] = help
+            key = (name, _label_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0, 'max': 0.0}
+                self._histograms[key] = histogram
+            for index, upper_bound in enumerate(histogram['buckets']):
+                if value <= upper_bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+            histogram['max'] = max(histogram['max'], value)
+
+    @contextmanager
+    def timer(self, name, help=None, **labels):
+        """Observe the wall time of the with-block, in seconds, into histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help=help, **labels)
+
+    def _quantile(self, histogram, quantile):
+        # Upper bound of the bucket containing the quantile; good enough to spot a slow stage.
+        target = quantile * histogram['count']
+        running = 0
+        for upper_bound, count in zip(histogram['buckets'], histogram['counts']):
+            running += count
+            if running >= target:
+                return upper_bound
+        return histogram['max']
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, label_key), value in sorted(self._counters.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(label_key)} {value}")
+            for (name, label_key), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{_format_labels(label_key)} {value}")
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for upper_bound, count in zip(histogram['buckets'], histogram['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(label_key, [('le', upper_bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(label_key), 'value': value}
+                             for (name, label_key), value in sorted(self._counters.items())],
+                'gauges': [{'name': name, 'labels': dict(label_key), 'value': value}
+                           for (name, label_key), value in sorted(self._gauges.items())],
+                'histograms': [{
+                    'name': name,
+                    'labels': dict(label_key),
+                    'count': histogram['count'],
+                    'sum': round(histogram['sum'], 6),
+                    'mean': round(histogram['sum'] / histogram['count'], 6) if histogram['count'] else 0,
+                    'max': round(histogram['max'], 6),
+                    'p50': self._quantile(histogram, 0.5),
+                    'p95': self._quantile(histogram, 0.95),
+                    'buckets': dict(zip([str(bound) for bound in histogram['buckets']], histogram['counts'])),
+                } for (name, label_key), histogram in sorted(self._histograms.items())],
+            }
+
+
+# Process-wide registry used by the stage scripts and utility modules
+registry = MetricsRegistry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+timer = registry.timer
+
+def get_metrics_dir(run_id=None):
+    return os.path.join(METRICS_DIR, run_id or get_run_id())
+
+def export_stage_metrics(stage):
+    """Write this process's metrics as <stage>.prom and <stage>.json under metrics/<run_id>/."""
+    metrics_dir = get_metrics_dir()
+    os.makedirs(metrics_dir, exist_ok=True)
+    finished_at = time.time()
+    registry.set_gauge('stage_wall_seconds', round(finished_at - registry.started_at, 3), help="Wall time of the stage process.", stage=stage)
+
+    prometheus_path = os.path.join(metrics_dir, f"{stage}.prom")
+    with open(prometheus_path, 'w', encoding='utf-8') as prometheus_file:
+        prometheus_file.write(registry.to_prometheus())
+
+    report = {
+        'run_id': get_run_id(),
+        'stage': stage,
+        'started_at': datetime.datetime.fromtimestamp(registry.started_at).isoformat(),
+        'finished_at': datetime.datetime.fromtimestamp(finished_at).isoformat(),
+        'wall_seconds': round(finished_at - registry.started_at, 3),
+        'metrics': registry.to_dict(),
+    }
+    json_path = os.path.join(metrics_dir, f"{stage}.json")
+    with open(json_path, 'w', encoding='utf-8') as json_file:
+        json.dump(report, json_file, indent=4)
+    print(f"Metrics written to {prometheus_path} and {json_path}")
+    return report
+
+def write_run_report(run_id=None):
+    """Merge the per-stage JSON files of a run into metrics/<run_id>/run_report.json."""
+    metrics_dir = get_metrics_dir(run_id)
+    if not os.path.exists(metrics_dir):
+        return None
+    stages = {}
+    for filename in sorted(os.listdir(metrics_dir)):
+        if filename.endswith(".json") and filename != "run_report.json":
+            with open(os.path.join(metrics_dir, filename), 'r', encoding='utf-8') as stage_file:
+                stage_report = json.load(stage_file)
+            stages[stage_report['stage']] = stage_report
+    report = {
+        'run_id': run_id or get_run_id(),
+        'total_wall_seconds': round(sum(stage['wall_seconds'] for stage in stages.values()), 3),
+        'stages': stages,
+    }
+    report_path = os.path.join(metrics_dir, "run_report.json")
+    with open(report_path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=4)
+    print(f"Run report written to {report_path}")
+    return report
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from pipeline_metrics import get_run_id
+
+# Opt-in profiling for the stage scripts (`--profile`, passed through by 0_run_all.py).
+# A profiled run writes to profiles/<run_id>/<stage>/:
+#   cprofile.pstats   - cProfile stats of the main thread and the scheduler's worker threads
+#                       (profile_thread), for `python -m pstats` or snakeviz
+#   stacks.collapsed  - sampled wall-clock stacks of every thread, rooted at the thread name,
+#                       for flamegraph.pl or speedscope
+#   memory.txt        - tracemalloc peak and top allocation sites
+#   timings.json      - wall time per call of the hot paths marked with @profiled / profile_section
+PROFILES_DIR = "profiles"
+PROFILE_ENV = 'PIPELINE_PROFILE'
+SAMPLE_INTERVAL_SECONDS = 0.005
+TRACEMALLOC_FRAMES = 25
+
+_enabled = False
+_timings = defaultdict(list)
+_timings_lock = threading.Lock()
+_thread_profilers = []
+
+def profiling_requested(cli_flag=False):
+    return cli_flag or os.environ.get(PROFILE_ENV, '').lower() in ('1', 'true')
+
+def _record_timing(name, elapsed_seconds):
+    with _timings_lock:
+        _timings[name].append(elapsed_seconds)
+
+def profiled(name=None):
+    """Decorator recording the wall time of every call while a profiled run is active."""
+    def decorator(func):
+        timing_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record_timing(timing_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+@contextmanager
+def profile_thread():
+    """Profile the calling thread with its own cProfile while a profiled run is active (for worker threads)."""
+    if not _enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ profiles through sys.monitoring, so the run's profiler already sees every thread.
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _timings_lock:
+            _thread_profilers.append(profiler)
+
+@contextmanager
+def profile_section(name):
+    """Record the wall time of a with-block (e.g. one loop iteration) while profiling."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_timing(name, time.perf_counter() - start)
+
+
+class StackSampler(threading.Thread):
+    """Samples every other thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _write_memory_report(memory_path, peak_bytes, snapshot):
+    with open(memory_path, 'w', encoding='utf-8') as memory_file:
+        memory_file.write(f"Peak traced memory: {peak_bytes / (1024 * 1024):.2f} MB\n\n")
+        memory_file.write("Top allocation sites at exit:\n")
+        for statistic in snapshot.statistics('lineno')[:25]:
+            memory_file.write(f"{statistic}\n")
+
+def _write_timings(timings_path):
+    with _timings_lock:
+        summary = {
+            name: {
+                'calls': len(samples),
+                'total_seconds': round(sum(samples), 6),
+                'mean_seconds': round(sum(samples) / len(samples), 6),
+                'max_seconds': round(max(samples), 6),
+            } for name, samples in sorted(_timings.items())
+        }
+    with open(timings_path, 'w', encoding='utf-8') as timings_file:
+        json.dump(summary, timings_file, indent=4)
+
+@contextmanager
+def profile_run(stage, enabled):
+    """Profile the with-block with cProfile, tracemalloc and a stack sampler when enabled."""
+    global _enabled
+    if not enabled:
+        yield None
+        return
+
+    profile_dir = os.path.join(PROFILES_DIR, get_run_id(), stage)
+    os.makedirs(profile_dir, exist_ok=True)
+    print(f"Profiling {stage}; results will be written to {profile_dir}")
+
+    _enabled = True
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    sampler = StackSampler()
+    sampler.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profile_dir
+    finally:
+        profiler.disable()
+        sampler.stop()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        _enabled = False
+
+        stats = pstats.Stats(profiler)
+        with _timings_lock:
+            for thread_profiler in _thread_profilers:
+                stats.add(thread_profiler)
+            _thread_profilers.clear()
+        stats.dump_stats(os.path.join(profile_dir, "cprofile.pstats"))
+        with open(os.path.join(profile_dir, "stacks.collapsed"), 'w', encoding='utf-8') as stacks_file:
+            for stack, count in sampler.stacks.most_common():
+                stacks_file.write(f"{stack} {count}\n")
+        _write_memory_report(os.path.join(profile_dir, "memory.txt"), peak_bytes, snapshot)
+        _write_timings(os.path.join(profile_dir, "timings.json"))
+        print(f"Profile written to {profile_dir} (peak traced memory {peak_bytes / (1024 * 1024):.2f} MB)")
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from job_manifest import load_manifest, update_manifest
+from pipeline_metrics import get_run_id
+
+# Lightweight tracing for one submission across the three stage processes.
+# The trace id and root span id of each pk_id live in its job manifest, so spans
+# created by 1_download_audio.py, 2_transcribe_audio.py and 3_summarize_with_openai.py
+# all join the same trace. Each stage writes its finished spans as OTLP/JSON to
+# traces/<run_id>/<stage>.json, which any OTLP-compatible viewer can import.
+TRACES_DIR = "traces"
+SERVICE_NAME = "download_and_summarize_youtube"
+
+# OTLP span status codes and kinds
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_finished_spans = []
+_spans_lock = threading.Lock()
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+def new_span_id():
+    return secrets.token_hex(8)
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_span_id=None, span_id=None, start_time_ns=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id or new_span_id()
+        self.parent_span_id = parent_span_id
+        self.start_time_ns = start_time_ns or time.time_ns()
+        self.end_time_ns = None
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.status = {'code': STATUS_CODE_OK}
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def context(self):
+        """Return (trace_id, span_id) for parenting spans started on another thread."""
+        return self.trace_id, self.span_id
+
+    def end(self):
+        self.end_time_ns = time.time_ns()
+        with _spans_lock:
+            _finished_spans.append(self)
+
+    def to_otlp(self):
+        otlp_span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': SPAN_KIND_INTERNAL,
+            'startTimeUnixNano': str(self.start_time_ns),
+            'endTimeUnixNano': str(self.end_time_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'status': self.status,
+        }
+        if self.parent_span_id:
+            otlp_span['parentSpanId'] = self.parent_span_id
+        return otlp_span
+
+
+def get_job_trace(pk_id):
+    """Return (trace_id, root_span_id) for a job, creating them in its manifest on first use."""
+    manifest = load_manifest(pk_id) or {}
+    if manifest.get('trace_id'):
+        return manifest['trace_id'], manifest['trace_root_span_id']
+    trace_id, root_span_id = new_trace_id(), new_span_id()
+    update_manifest(pk_id, trace_id=trace_id, trace_root_span_id=root_span_id, trace_started_at_ns=time.time_ns())
+    return trace_id, root_span_id
+
+@contextmanager
+def span(name, pk_id=None, parent=None, **attributes):
+    """
+    Record the with-block as a span. The parent is, in order: an explicit (trace_id, span_id)
+    `parent`, the span currently open in this context, or the job's root span when pk_id is given.
+    """
+    current = _current_span.get()
+    if parent is not None:
+        trace_id, parent_span_id = parent
+    elif current is not None:
+        trace_id, parent_span_id = current.trace_id, current.span_id
+    elif pk_id is not None:
+        trace_id, parent_span_id = get_job_trace(pk_id)
+    else:
+        trace_id, parent_span_id = new_trace_id(), None
+
+    if pk_id is not None:
+        attributes['pk_id'] = pk_id
+    attributes.setdefault('run_id', get_run_id())
+    attributes.setdefault('process.pid', os.getpid())
+    current_span = Span(name, trace_id, parent_span_id, attributes=attributes)
+    token = _current_span.set(current_span)
+    try:
+        yield current_span
+    except BaseException as e:
+        current_span.status = {'code': STATUS_CODE_ERROR, 'message': str(e)}
+        raise
+    finally:
+        _current_span.reset(token)
+        current_span.end()
+
+def current_span_context():
+    current = _current_span.get()
+    return current.context() if current is not None else None
+
+def finish_job_trace(pk_id, **attributes):
+    """Close the job's root span, covering the time from its first stage until now."""
+    manifest = load_manifest(pk_id) or {}
+    if not manifest.get('trace_id'):
+        return
+    attributes.update(pk_id=pk_id, source_url=manifest.get('source_url'), ingest_point=manifest.get('ingest_point'))
+    root_span = Span('submission', manifest['trace_id'], span_id=manifest['trace_root_span_id'],
+                     start_time_ns=manifest.get('trace_started_at_ns'), attributes=attributes)
+    root_span.end()
+
+def export_spans(stage):
+    """Write the spans finished in this process to traces/<run_id>/<stage>.json as OTLP/JSON."""
+    with _spans_lock:
+        spans = list(_finished_spans)
+    if not spans:
+        return None
+    traces_dir = os.path.join(TRACES_DIR, get_run_id())
+    os.makedirs(traces_dir, exist_ok=True)
+    export = {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': _otlp_value(SERVICE_NAME)},
+                {'key': 'pipeline.stage', 'value': _otlp_value(stage)},
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': 'pipeline_tracing'},
+                'spans': [finished_span.to_otlp() for finished_span in spans],
+            }],
+        }]
+    }
+    trace_path = os.path.join(traces_dir, f"{stage}.json")
+    with open(trace_path, 'w', encoding='utf-8') as trace_file:
+        json.dump(export, trace_file, indent=4)
+    print(f"Wrote {len(spans)} trace span(s) to {trace_path}")
+    return trace_path
@@ -0,0 +1,287 @@
+import os
+import json
+import math
+import argparse
+
+from audio_postgres_utils import fetch_audio_submissions
+from pipeline_metrics import METRICS_DIR
+from work_scheduler import order_jobs, assign_lpt, estimate_duration_seconds
+from workspace_manager import estimate_media_bytes, WORKSPACE_QUOTA_BYTES
+from model_router import route_models, estimate_cost, predict_latency_seconds, EXPECTED_OUTPUT_RATIO
+from transcript_store import find_processed_source_ids, source_id_for, summary_usage_totals
+from youtube_utils import classify_youtube_url, get_cached_video_metadata, get_cached_caption_availability, get_cached_collection
+
+# Run planner: predicts how long 0_run_all.py will take on the pending queue, and
+# what it will cost, before it is started. Pending rows of prod_user_audio_submissions
+# are sized from file_size, the cached YouTube metadata (durations, playlist and
+# channel listings) and the cached caption availability. Each job is costed per
+# stage with the throughput recorded in metrics/<run_id>/ by earlier runs, and the
+# jobs are laid out over the workers with the same fair-share LPT order the stages
+# use. Throughput that no earlier run recorded falls back to PRIOR_THROUGHPUT.
+#
+#   python plan_run.py --workers 1 2 4 8
+#   python plan_run.py --workers 4 --json
+
+HISTORY_RUNS = 10  # Most recent runs to learn throughput from
+CHUNK_LENGTH_SECONDS = 30  # 2_transcribe_audio.GLOBAL_CHUNK_LENGTH
+INGEST_POINTS = ('youtube', 'gdrive')  # The ones 1_download_audio.py can download
+
+PRIOR_THROUGHPUT = {
+    'download_bytes_per_second_youtube': 2_000_000,
+    'download_bytes_per_second_gdrive': 5_000_000,
+    'ytdlp_extract_seconds': 3.0,
+    'recognizer_chunk_seconds': 2.0,
+    'decode_seconds_per_audio_second': 0.005,
+    'fingerprint_seconds_per_audio_second': 0.002,
+    'caption_transcript_seconds': 0.5,
+    'email_seconds': 2.0,
+    'audio_seconds_per_file': 600.0,
+    'transcript_tokens_per_audio_second': 3.3,  # About 150 spoken words a minute
+    'completion_token_ratio': EXPECTED_OUTPUT_RATIO,
+}
+
+# Function: Load the per-stage metrics of the most recent runs, skipping benchmark runs.
+def load_run_history(max_runs=HISTORY_RUNS):
+    if not os.path.exists(METRICS_DIR):
+        return []
+    run_dirs = [
+        os.path.join(METRICS_DIR, name) for name in os.listdir(METRICS_DIR)
+        if os.path.isdir(os.path.join(METRICS_DIR, name)) and not name.startswith('bench_')
+    ]
+    history = []
+    for run_dir in sorted(run_dirs, key=os.path.getmtime, reverse=True)[:max_runs]:
+        for filename in os.listdir(run_dir):
+            if filename.endswith(".json") and filename != "run_report.json":
+                with open(os.path.join(run_dir, filename), 'r', encoding='utf-8') as stage_file:
+                    history.append(json.load(stage_file))
+    return history
+
+def _matches(metric, labels):
+    return all(metric['labels'].get(key) == value for key, value in labels.items())
+
+def _counter_total(history, name, **labels):
+    return sum(counter['value'] for report in history for counter in report['metrics']['counters']
+               if counter['name'] == name and _matches(counter, labels))
+
+def _histogram_totals(history, name, **labels):
+    """(sum, count) of a histogram over all runs and matching label sets."""
+    histograms = [histogram for report in history for histogram in report['metrics']['histograms']
+                  if histogram['name'] == name and _matches(histogram, labels)]
+    return sum(histogram['sum'] for histogram in histograms), sum(histogram['count'] for histogram in histograms)
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if numerator and denominator else None
+
+# Function: Throughput figures from earlier runs, falling back to PRIOR_THROUGHPUT.
+def load_throughput(max_runs=HISTORY_RUNS):
+    """Returns (throughput, learned), where learned names the figures that came from recorded runs."""
+    history = load_run_history(max_runs)
+    audio_seconds = _counter_total(history, 'audio_seconds_transcribed_total') + _counter_total(history, 'audio_seconds_deduplicated_total')
+    observed = {
+        'recognizer_chunk_seconds': _ratio(*_histogram_totals(history, 'recognizer_chunk_seconds')),
+        'ytdlp_extract_seconds': _ratio(*_histogram_totals(history, 'ytdlp_extract_seconds')),
+        'decode_seconds_per_audio_second': _ratio(_histogram_totals(history, 'audio_decode_seconds')[0], audio_seconds),
+        'fingerprint_seconds_per_audio_second': _ratio(_histogram_totals(history, 'audio_fingerprint_seconds')[0], audio_seconds),
+        'caption_transcript_seconds': _ratio(*_histogram_totals(history, 'caption_transcript_seconds')),
+        'email_seconds': _ratio(*_histogram_totals(history, 'smtp_send_seconds')),
+        'audio_seconds_per_file': _ratio(_counter_total(history, 'audio_seconds_transcribed_total'),
+                                         _counter_total(history, 'files_transcribed_total', source='recognizer')),
+    }
+    for ingest_point in INGEST_POINTS:
+        # Per-stream rate: bytes over the summed wall time of the individual downloads.
+        observed[f'download_bytes_per_second_{ingest_point}'] = _ratio(
+            _counter_total(history, 'download_bytes_total', ingest_point=ingest_point),
+            _histogram_totals(history, 'download_seconds', ingest_point=ingest_point)[0])
+
+    usage = summary_usage_totals()
+    if usage and usage['summaries']:
+        observed['transcript_tokens_per_audio_second'] = _ratio(usage['token_count'], usage['audio_seconds'])
+        observed['completion_token_ratio'] = _ratio(usage['completion_tokens'], usage['prompt_tokens'])
+
+    learned = sorted(key for key, value in observed.items() if value is not None)
+    throughput = {**PRIOR_THROUGHPUT, **{key: observed[key] for key in learned}}
+    return throughput, learned
+
+# Function: Turn pending submission rows into one plan job per video or file.
+def collect_plan_jobs(submissions):
+    """
+    Playlist and channel rows are replaced by their cached listing, minus videos the same user already
+    has in the transcript store (as 1_download_audio.py does). Collections without a cached listing, and rows
+    with an ingest point the download stage does not handle, cannot be sized.
+    Returns (jobs, unsized_pk_ids), where unsized_pk_ids maps the reason to the pk_ids.
+    """
+    jobs = []
+    unsized = {'unexpanded_collection': [], 'unsupported_ingest_point': []}
+    for submission in submissions:
+        url = submission['audio_url']
+        if submission['ingest_point'] not in INGEST_POINTS:
+            unsized['unsupported_ingest_point'].append(submission['pk_id'])
+            continue
+        base_job = {
+            'pk_id': submission['pk_id'],
+            'ingest_point': submission['ingest_point'],
+            'email_address': submission['email_address'],
+            'custom_prompt': bool(submission.get('user_request_of_audio')),
+            'file_size': submission['file_size'],
+            'source_url': url,
+        }
+        kind, source = classify_youtube_url(url) if submission['ingest_point'] == 'youtube' else (None, None)
+        if kind in ('playlist', 'channel'):
+            entries = get_cached_collection(url)
+            if entries is None:
+                unsized['unexpanded_collection'].append(submission['pk_id'])
+                continue
+            processed = find_processed_source_ids((entry['video_id'] for entry in entries), email_address=submission['email_address'])
+            for entry in entries:
+                if entry['video_id'] not in processed:
+                    jobs.append({**base_job, 'source_url': entry['url'], 'video_id': entry['video_id'],
+                                 'file_size': None, 'duration_seconds': entry.get('duration'), 'metadata_cached': True})
+            continue
+        video_id = source if kind == 'video' else None
+        metadata = get_cached_video_metadata(video_id) if video_id else None
+        jobs.append({**base_job, 'video_id': video_id, 'duration_seconds': (metadata or {}).get('duration'),
+                     'metadata_cached': metadata is not None})
+
+    stored_source_ids = find_processed_source_ids({source_id_for(job) for job in jobs} - {None})
+    for job in jobs:
+        job['captions'] = get_cached_caption_availability(job['video_id']) if job['video_id'] else None
+        job['in_store'] = source_id_for(job) in stored_source_ids
+    return jobs, unsized
+
+# Function: Predict the per-stage work of one job.
+def estimate_job(job, throughput):
+    duration_seconds = estimate_duration_seconds(job['duration_seconds'], job['file_size'])
+    job['duration_estimated'] = not job['duration_seconds']
+    if not duration_seconds:
+        duration_seconds = throughput['audio_seconds_per_file']
+    job['audio_seconds'] = duration_seconds
+
+    job['media_bytes'] = estimate_media_bytes(job['file_size'], duration_seconds)
+    download_seconds = job['media_bytes'] / throughput[f"download_bytes_per_second_{job['ingest_point']}"]
+    if job['ingest_point'] == 'youtube' and not job['metadata_cached']:
+        download_seconds += throughput['ytdlp_extract_seconds']
+    job['download_seconds'] = download_seconds
+
+    # Same order of preference as 2_transcribe_audio.py: captions, then a fingerprint match, then the recognizer.
+    decode_seconds = duration_seconds * (throughput['decode_seconds_per_audio_second'] + throughput['fingerprint_seconds_per_audio_second'])
+    if job['captions']:
+        job['transcript_source'] = 'captions'
+        job['recognizer_calls'] = 0
+        job['transcribe_seconds'] = throughput['caption_transcript_seconds']
+    elif job['in_store']:
+        job['transcript_source'] = 'fingerprint'
+        job['recognizer_calls'] = 0
+        job['transcribe_seconds'] = decode_seconds
+    else:
+        job['transcript_source'] = 'recognizer'
+        job['recognizer_calls'] = math.ceil(duration_seconds / CHUNK_LENGTH_SECONDS)
+        job['transcribe_seconds'] = decode_seconds + job['recognizer_calls'] * throughput['recognizer_chunk_seconds']
+
+    prompt_tokens = int(duration_seconds * throughput['transcript_tokens_per_audio_second'])
+    entry = route_models(prompt_tokens, job['custom_prompt'])[0]
+    job['model'] = entry['model']
+    job['prompt_tokens'] = prompt_tokens
+    job['completion_tokens'] = int(prompt_tokens * throughput['completion_token_ratio'])
+    job['cost'] = estimate_cost(entry, prompt_tokens, job['completion_tokens'])
+    job['summarize_seconds'] = predict_latency_seconds(entry, prompt_tokens) + throughput['email_seconds']
+    return job
+
+# Function: Wall time of a stage when its jobs are spread over the workers in LPT order.
+def stage_wall_seconds(jobs, seconds_key, workers):
+    if not jobs:
+        return 0.0
+    duration_fn = lambda job: job[seconds_key]
+    ordered = order_jobs(jobs, duration_fn, owner_fn=lambda job: job['email_address'])
+    return max(sum(duration_fn(job) for job in queue) for queue in assign_lpt(ordered, duration_fn, max(1, workers)))
+
+# Function: Build the plan for the pending queue at each worker count.
+def plan_run(submissions, worker_counts, max_runs=HISTORY_RUNS):
+    throughput, learned = load_throughput(max_runs)
+    jobs, unsized = collect_plan_jobs(submissions)
+    jobs = [estimate_job(job, throughput) for job in jobs]
+
+    costs_by_model = {}
+    for job in jobs:
+        costs_by_model[job['model']] = costs_by_model.get(job['model'], 0.0) + job['cost']
+
+    scenarios = []
+    for workers in worker_counts:
+        stages = {
+            'download': stage_wall_seconds(jobs, 'download_seconds', workers),
+            'transcribe': stage_wall_seconds(jobs, 'transcribe_seconds', workers),
+            'summarize': stage_wall_seconds(jobs, 'summarize_seconds', 1),  # Stage 3 summarizes one job at a time
+        }
+        scenarios.append({
+            'workers': workers,
+            'stage_wall_seconds': {stage: round(seconds, 1) for stage, seconds in stages.items()},
+            'total_wall_seconds': round(sum(stages.values()), 1),
+            # With 0_run_all.py --stream, summarizing overlaps transcription.
+            'total_wall_seconds_stream': round(stages['download'] + max(stages['transcribe'], stages['summarize']), 1),
+        })
+
+    return {
+        'pending_submissions': len(submissions),
+        'jobs': len(jobs),
+        'unsized_pk_ids': unsized,
+        'jobs_with_estimated_duration': sum(job['duration_estimated'] for job in jobs),
+        'audio_hours': round(sum(job['audio_seconds'] for job in jobs) / 3600, 2),
+        'media_gb': round(sum(job['media_bytes'] for job in jobs) / 1024 ** 3, 2),
+        'workspace_quota_gb': round(WORKSPACE_QUOTA_BYTES / 1024 ** 3, 2),
+        'transcript_sources': {source: sum(job['transcript_source'] == source for job in jobs) for source in ('captions', 'fingerprint', 'recognizer')},
+        'recognizer_calls': sum(job['recognizer_calls'] for job in jobs),
+        'openai_prompt_tokens': sum(job['prompt_tokens'] for job in jobs),
+        'openai_completion_tokens': sum(job['completion_tokens'] for job in jobs),
+        'openai_cost_dollars': round(sum(costs_by_model.values()), 2),
+        'openai_cost_dollars_by_model': {model: round(cost, 2) for model, cost in sorted(costs_by_model.items())},
+        'scenarios': scenarios,
+        'throughput': throughput,
+        'throughput_learned_from_history': learned,
+    }
+
+# Function: Convert seconds to a time string.
+def time_str(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{int(hours)}h {int(minutes)}m {int(seconds)}s"
+
+# Function: Print a plan for people.
+def print_plan(plan):
+    print(f"Pending submissions: {plan['pending_submissions']} -> {plan['jobs']} jobs")
+    if plan['unsized_pk_ids']['unexpanded_collection']:
+        print(f"Not sized (playlist/channel not listed yet): pk_ids {plan['unsized_pk_ids']['unexpanded_collection']}")
+    if plan['unsized_pk_ids']['unsupported_ingest_point']:
+        print(f"Not sized (ingest point not handled by the download stage): pk_ids {plan['unsized_pk_ids']['unsupported_ingest_point']}")
+    print(f"Audio: {plan['audio_hours']} h ({plan['jobs_with_estimated_duration']} jobs with an estimated duration)")
+    print(f"Media to download: {plan['media_gb']} GB (workspace quota {plan['workspace_quota_gb']} GB)")
+    if plan['media_gb'] > plan['workspace_quota_gb']:
+        print("  Warning: the batch does not fit the workspace quota; downloads past it will be deferred to the next run.")
+    sources = plan['transcript_sources']
+    print(f"Transcripts: {sources['captions']} from captions, {sources['fingerprint']} from fingerprint matches, {sources['recognizer']} through the recognizer")
+    print(f"Recognizer calls: {plan['recognizer_calls']}")
+    print(f"OpenAI tokens: {plan['openai_prompt_tokens']} prompt + {plan['openai_completion_tokens']} completion")
+    print(f"OpenAI cost: ${plan['openai_cost_dollars']:.2f} {plan['openai_cost_dollars_by_model']}")
+    print(f"Throughput from earlier runs: {', '.join(plan['throughput_learned_from_history']) or 'none (using priors)'}")
+    print()
+    print(f"{'workers':>7}  {'download':>12}  {'transcribe':>12}  {'summarize':>12}  {'total':>12}  {'total --stream':>14}")
+    for scenario in plan['scenarios']:
+        stages = scenario['stage_wall_seconds']
+        print(f"{scenario['workers']:>7}  {time_str(stages['download']):>12}  {time_str(stages['transcribe']):>12}  "
+              f"{time_str(stages['summarize']):>12}  {time_str(scenario['total_wall_seconds']):>12}  {time_str(scenario['total_wall_seconds_stream']):>14}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict run time, recognizer calls and OpenAI cost for the pending submissions.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[int(os.environ.get('PIPELINE_WORKERS', 1))],
+                        help="Worker counts to plan for (download and transcription stages).")
+    parser.add_argument('--history', type=int, default=HISTORY_RUNS, help="Most recent runs in metrics/ to learn throughput from.")
+    parser.add_argument('--json', action='store_true', help="Print the plan as JSON.")
+    args = parser.parse_args()
+
+    submissions = [dict(row) for row in fetch_audio_submissions() or []]
+    plan = plan_run(submissions, args.workers, args.history)
+    if args.json:
+        print(json.dumps(plan, indent=4))
+    else:
+        print_plan(plan)
+
+if __name__ == "__main__":
+    main()
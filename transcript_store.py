@@ -0,0 +1,265 @@
+import os
+import re
+import csv
+import json
+import sqlite3
+import argparse
+import datetime
+import threading
+
+# Durable, searchable store for transcripts and summaries. The CSVs in transcribe/
+# are wiped by the next run; this SQLite database keeps every job's metadata, its
+# per-chunk text with timestamps, and each summary with its OpenAI usage. Jobs are
+# indexed by pk_id and source ID (YouTube video ID or Google Drive file ID), and the
+# chunk and summary text by SQLite FTS5, so "what did we summarize for this video"
+# is a query:
+#
+#   python transcript_store.py source <video_id>
+#   python transcript_store.py search "quarterly revenue"
+#   python transcript_store.py job <pk_id>
+
+TRANSCRIPT_STORE_PATH = os.environ.get('TRANSCRIPT_STORE_PATH', os.path.join("store", "transcripts.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    pk_id INTEGER PRIMARY KEY,
+    source_id TEXT,
+    source_url TEXT,
+    ingest_point TEXT,
+    title TEXT,
+    email_address TEXT,
+    duration_ms INTEGER,
+    transcript_source TEXT,
+    transcribed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_source_id ON jobs (source_id);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id INTEGER PRIMARY KEY,
+    pk_id INTEGER NOT NULL,
+    chunk_number INTEGER NOT NULL,
+    start_seconds REAL,
+    end_seconds REAL,
+    text TEXT,
+    recorded_at TEXT,
+    UNIQUE (pk_id, chunk_number)
+);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    summary_row_id INTEGER PRIMARY KEY,
+    pk_id INTEGER NOT NULL,
+    summary_id TEXT,
+    model TEXT,
+    prompt TEXT,
+    summary TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    token_count INTEGER,
+    total_cost_estimate REAL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS summaries_by_pk_id ON summaries (pk_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, content='chunks', content_rowid='chunk_id');
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(summary, content='summaries', content_rowid='summary_row_id');
+CREATE TRIGGER IF NOT EXISTS summaries_ai AFTER INSERT ON summaries BEGIN
+    INSERT INTO summaries_fts (rowid, summary) VALUES (new.summary_row_id, new.summary);
+END;
+"""
+
+_store_lock = threading.Lock()
+
+def _connect(store_path=None):
+    store_path = store_path or TRANSCRIPT_STORE_PATH
+    os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+    connection = sqlite3.connect(store_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")  # Stages 2 and 3 may write at the same time
+    connection.executescript(SCHEMA)
+    return connection
+
+def source_id_for(manifest):
+    """YouTube video ID or Google Drive file ID of a job, else its URL."""
+    if manifest.get('video_id'):
+        return manifest['video_id']
+    source_url = manifest.get('source_url') or ''
+    drive_match = re.search(r'/file/d/([a-zA-Z0-9_-]+)', source_url) or re.search(r'[?&]id=([a-zA-Z0-9_-]+)', source_url)
+    return drive_match.group(1) if drive_match else (source_url or None)
+
+def _seconds(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def record_transcript_log(pk_id, csv_path, manifest=None, transcript_source=None, store_path=None):
+    """
+    Store a job and the chunks of its transcription log CSV, replacing any chunks stored before.
+    Returns the number of chunks stored.
+    """
+    with open(csv_path, 'r', newline='', encoding='utf-8') as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    manifest = manifest or {}
+    recorded_at = datetime.datetime.now().isoformat()
+
+    chunks = []
+    for row in rows:
+        chunk_number = int(row['chunk_number'])
+        chunk_length = _seconds(row.get('chunk_length_in_seconds'))
+        start_seconds = (chunk_number - 1) * chunk_length if chunk_length is not None else None
+        end_seconds = start_seconds + chunk_length if chunk_length is not None else None
+        chunks.append((pk_id, chunk_number, start_seconds, end_seconds, row.get('transcribed_text') or '', row.get('time_stamp') or recorded_at))
+
+    with _store_lock:
+        connection = _connect(store_path)
+        try:
+            with connection:
+                connection.execute(
+                    """INSERT INTO jobs (pk_id, source_id, source_url, ingest_point, title, email_address, duration_ms, transcript_source, transcribed_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (pk_id) DO UPDATE SET
+                           source_id = excluded.source_id, source_url = excluded.source_url, ingest_point = excluded.ingest_point,
+                           title = excluded.title, email_address = excluded.email_address, duration_ms = excluded.duration_ms,
+                           transcript_source = excluded.transcript_source, transcribed_at = excluded.transcribed_at""",
+                    (pk_id, source_id_for(manifest), manifest.get('source_url'), manifest.get('ingest_point'), manifest.get('title'),
+                     manifest.get('email_address'), manifest.get('duration_ms'), transcript_source or manifest.get('transcript_source'), recorded_at),
+                )
+                connection.execute("DELETE FROM chunks WHERE pk_id = ?", (pk_id,))
+                connection.executemany(
+                    "INSERT INTO chunks (pk_id, chunk_number, start_seconds, end_seconds, text, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    chunks,
+                )
+        finally:
+            connection.close()
+    return len(chunks)
+
+def record_summary(pk_id, response_data, prompt, token_count, total_cost_estimate, store_path=None):
+    """Store one summary response and its usage for pk_id."""
+    usage = response_data.get('usage') or {}
+    summary = response_data['choices'][0]['message']['content'] if response_data.get('choices') else None
+    with _store_lock:
+        connection = _connect(store_path)
+        try:
+            with connection:
+                connection.execute(
+                    """INSERT INTO summaries (pk_id, summary_id, model, prompt, summary, prompt_tokens, completion_tokens, total_tokens, token_count, total_cost_estimate, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (pk_id, response_data.get('id'), response_data.get('model'), prompt, summary, usage.get('prompt_tokens'),
+                     usage.get('completion_tokens'), usage.get('total_tokens'), token_count, total_cost_estimate,
+                     datetime.datetime.now().isoformat()),
+                )
+        finally:
+            connection.close()
+
+def has_transcript(pk_id, store_path=None):
+    """True when chunks for pk_id are stored."""
+    with _store_lock:
+        connection = _connect(store_path)
+        try:
+            return connection.execute("SELECT 1 FROM chunks WHERE pk_id = ? LIMIT 1", (pk_id,)).fetchone() is not None
+        finally:
+            connection.close()
+
+def find_processed_source_ids(source_ids, email_address=None, store_path=None):
+    """The subset of source_ids that already have a stored transcript (for email_address's jobs only, if given)."""
+    source_ids = list(source_ids)
+    if not source_ids or not os.path.exists(store_path or TRANSCRIPT_STORE_PATH):
+        return set()
+    processed = set()
+    for start in range(0, len(source_ids), 500):
+        batch = source_ids[start:start + 500]
+        user_filter = " AND jobs.email_address = ?" if email_address is not None else ""
+        rows = _query(
+            f"""SELECT DISTINCT jobs.source_id FROM jobs JOIN chunks ON chunks.pk_id = jobs.pk_id
+                WHERE jobs.source_id IN ({",".join("?" * len(batch))}){user_filter}""",
+            batch + ([email_address] if email_address is not None else []), store_path)
+        processed.update(row['source_id'] for row in rows)
+    return processed
+
+def summary_usage_totals(store_path=None):
+    """
+    Transcript tokens, OpenAI prompt and completion tokens, and audio seconds summed over the summaries
+    of jobs with a known duration, or None when the store does not exist yet.
+    """
+    if not os.path.exists(store_path or TRANSCRIPT_STORE_PATH):
+        return None
+    return _query(
+        """SELECT COUNT(*) AS summaries, SUM(summaries.token_count) AS token_count, SUM(summaries.prompt_tokens) AS prompt_tokens,
+                  SUM(summaries.completion_tokens) AS completion_tokens, SUM(jobs.duration_ms) / 1000.0 AS audio_seconds
+           FROM summaries JOIN jobs ON jobs.pk_id = summaries.pk_id
+           WHERE jobs.duration_ms IS NOT NULL AND summaries.token_count IS NOT NULL""",
+        (), store_path)[0]
+
+def _query(sql, parameters=(), store_path=None):
+    with _store_lock:
+        connection = _connect(store_path)
+        try:
+            return [dict(row) for row in connection.execute(sql, parameters)]
+        finally:
+            connection.close()
+
+def find_by_source(source_id, store_path=None):
+    """Jobs for a source ID with their summaries, newest first."""
+    return _query(
+        """SELECT jobs.pk_id, jobs.title, jobs.source_url, jobs.transcribed_at, summaries.model, summaries.summary,
+                  summaries.total_tokens, summaries.total_cost_estimate, summaries.created_at AS summarized_at
+           FROM jobs LEFT JOIN summaries ON summaries.pk_id = jobs.pk_id
+           WHERE jobs.source_id = ? ORDER BY jobs.transcribed_at DESC, summaries.created_at DESC""",
+        (source_id,), store_path)
+
+def search(query, limit=20, store_path=None):
+    """Full-text search over chunk and summary text. Returns matches with their job, time range and a snippet."""
+    chunk_matches = _query(
+        """SELECT 'chunk' AS kind, chunks.pk_id, jobs.source_id, jobs.title, chunks.chunk_number, chunks.start_seconds, chunks.end_seconds,
+                  snippet(chunks_fts, 0, '[', ']', '...', 12) AS snippet, bm25(chunks_fts) AS rank
+           FROM chunks_fts JOIN chunks ON chunks.chunk_id = chunks_fts.rowid LEFT JOIN jobs ON jobs.pk_id = chunks.pk_id
+           WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?""",
+        (query, limit), store_path)
+    summary_matches = _query(
+        """SELECT 'summary' AS kind, summaries.pk_id, jobs.source_id, jobs.title, NULL AS chunk_number, NULL AS start_seconds, NULL AS end_seconds,
+                  snippet(summaries_fts, 0, '[', ']', '...', 12) AS snippet, bm25(summaries_fts) AS rank
+           FROM summaries_fts JOIN summaries ON summaries.summary_row_id = summaries_fts.rowid LEFT JOIN jobs ON jobs.pk_id = summaries.pk_id
+           WHERE summaries_fts MATCH ? ORDER BY rank LIMIT ?""",
+        (query, limit), store_path)
+    return sorted(chunk_matches + summary_matches, key=lambda match: match['rank'])[:limit]
+
+def get_job(pk_id, store_path=None):
+    """A job with its ordered chunks and its summaries, or None."""
+    jobs = _query("SELECT * FROM jobs WHERE pk_id = ?", (pk_id,), store_path)
+    if not jobs:
+        return None
+    job = jobs[0]
+    job['chunks'] = _query("SELECT chunk_number, start_seconds, end_seconds, text FROM chunks WHERE pk_id = ? ORDER BY chunk_number", (pk_id,), store_path)
+    job['summaries'] = _query("SELECT * FROM summaries WHERE pk_id = ? ORDER BY created_at", (pk_id,), store_path)
+    return job
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the transcript and summary store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    search_parser = subparsers.add_parser('search', help="Full-text search over transcripts and summaries.")
+    search_parser.add_argument('query', help="FTS5 query, e.g. 'budget AND forecast' or '\"exact phrase\"'.")
+    search_parser.add_argument('--limit', type=int, default=20)
+    source_parser = subparsers.add_parser('source', help="Jobs and summaries for a YouTube video ID or Drive file ID.")
+    source_parser.add_argument('source_id')
+    job_parser = subparsers.add_parser('job', help="Everything stored for one pk_id.")
+    job_parser.add_argument('pk_id', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'search':
+        result = search(args.query, args.limit)
+    elif args.command == 'source':
+        result = find_by_source(args.source_id)
+    else:
+        result = get_job(args.pk_id)
+    print(json.dumps(result, indent=4, default=str))
+
+if __name__ == "__main__":
+    main()
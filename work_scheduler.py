@@ -0,0 +1,147 @@
+import heapq
+import logging
+import threading
+from collections import defaultdict, deque
+
+from pipeline_profiling import profile_thread
+
+# Duration-aware scheduling for the download and transcription stages.
+# Jobs are ordered longest-processing-time first (LPT), optionally grouped by
+# priority and interleaved fairly across users, then assigned greedily to the
+# least-loaded worker. Workers that run out of work steal the shortest remaining
+# job from the most-loaded worker, so one long file picked last no longer
+# dominates the batch. A job that raises does not stop the other workers, but once
+# every job has run, ScheduledJobsFailed is raised so the stage still exits non-zero.
+
+# Rough bytes per second of audio for compressed media, used when only file_size is known.
+BYTES_PER_AUDIO_SECOND_ESTIMATE = 16_000
+
+def estimate_duration_seconds(duration_seconds=None, file_size=None):
+    """Best available duration estimate: a known duration, else one derived from the file size, else 0."""
+    if duration_seconds:
+        return float(duration_seconds)
+    if file_size:
+        try:
+            return float(file_size) / BYTES_PER_AUDIO_SECOND_ESTIMATE
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0
+
+def order_jobs(jobs, duration_fn, priority_fn=None, owner_fn=None):
+    """
+    Return jobs ordered for LPT scheduling. Higher priority comes first. Within a priority,
+    when owner_fn is given, each owner's n-th job is placed before any owner's (n+1)-th job
+    (fair share), and each such round is ordered longest first.
+    """
+    def sort_key(indexed_job):
+        round_number, job = indexed_job
+        priority = priority_fn(job) if priority_fn else 0
+        return (-priority, round_number, -duration_fn(job))
+
+    if owner_fn is None:
+        return sorted(jobs, key=lambda job: (-(priority_fn(job) if priority_fn else 0), -duration_fn(job)))
+
+    # Number each owner's jobs longest-first so the owner's biggest job lands in round 0.
+    jobs_by_owner = defaultdict(list)
+    for job in jobs:
+        jobs_by_owner[owner_fn(job)].append(job)
+    rounds = []
+    for owner_jobs in jobs_by_owner.values():
+        owner_jobs.sort(key=lambda job: (-(priority_fn(job) if priority_fn else 0), -duration_fn(job)))
+        rounds.extend(enumerate(owner_jobs))
+    return [job for _, job in sorted(rounds, key=sort_key)]
+
+def assign_lpt(ordered_jobs, duration_fn, workers):
+    """Greedily assign jobs in order to the currently least-loaded worker. Returns a list of deques."""
+    queues = [deque() for _ in range(workers)]
+    loads = [(0.0, index) for index in range(workers)]
+    heapq.heapify(loads)
+    for job in ordered_jobs:
+        load, index = heapq.heappop(loads)
+        queues[index].append(job)
+        heapq.heappush(loads, (load + duration_fn(job), index))
+    return queues
+
+
+class ScheduledJobsFailed(Exception):
+    """One or more jobs raised; failures holds the (job, exception) pairs."""
+
+    def __init__(self, failures, job_count):
+        self.failures = failures
+        super().__init__(f"{len(failures)} of {job_count} scheduled job(s) failed; first error: {failures[0][1]!r}")
+
+
+class WorkStealingScheduler:
+    """Runs jobs on worker threads from LPT-assigned queues, stealing work when a queue runs dry."""
+
+    def __init__(self, jobs, worker_fn, duration_fn, workers=1, priority_fn=None, owner_fn=None):
+        self.worker_fn = worker_fn
+        self.duration_fn = duration_fn
+        self.job_count = len(jobs)
+        self.workers = max(1, min(workers, len(jobs) or 1))
+        ordered = order_jobs(jobs, duration_fn, priority_fn, owner_fn)
+        self.queues = assign_lpt(ordered, duration_fn, self.workers)
+        self._lock = threading.Lock()
+        self.results = []
+        self.failures = []
+        self.steals = 0
+
+    def _remaining_load(self, index):
+        return sum(self.duration_fn(job) for job in self.queues[index])
+
+    def _next_job(self, index):
+        with self._lock:
+            if self.queues[index]:
+                return self.queues[index].popleft()  # Own queue: longest remaining first
+            # Steal the shortest job from the worker with the most remaining work.
+            victim = max(range(self.workers), key=self._remaining_load)
+            if self.queues[victim]:
+                self.steals += 1
+                return self.queues[victim].pop()
+            return None
+
+    def _run_worker(self, index):
+        while True:
+            job = self._next_job(index)
+            if job is None:
+                return
+            try:
+                result = self.worker_fn(job)
+            except Exception as e:
+                logging.exception(f"Scheduled job failed: {e}")
+                result = e
+                with self._lock:
+                    self.failures.append((job, e))
+            with self._lock:
+                self.results.append((job, result))
+
+    def _run_profiled_worker(self, index):
+        # cProfile only sees the thread it was enabled in, so each worker thread gets its own.
+        with profile_thread():
+            self._run_worker(index)
+
+    def run(self):
+        """
+        Run every job and return a list of (job, result) pairs in completion order.
+        Raises ScheduledJobsFailed after all jobs have run if any of them raised.
+        """
+        if self.workers == 1:
+            self._run_worker(0)
+        else:
+            self._run_threads()
+        if self.failures:
+            raise ScheduledJobsFailed(self.failures, self.job_count) from self.failures[0][1]
+        return self.results
+
+    def _run_threads(self):
+        threads = [threading.Thread(target=self._run_profiled_worker, args=(index,), name=f"worker-{index}") for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.steals:
+            logging.info(f"Work stealing moved {self.steals} job(s) between workers")
+
+
+def run_scheduled(jobs, worker_fn, duration_fn, workers=1, priority_fn=None, owner_fn=None):
+    return WorkStealingScheduler(jobs, worker_fn, duration_fn, workers, priority_fn, owner_fn).run()
@@ -0,0 +1,177 @@
+import os
+import time
+import errno
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+
+from job_manifest import load_manifest, update_manifest
+from pipeline_metrics import inc, observe, set_gauge
+
+# Disk budget for the working folders. Downloads and PCM decodes reserve their
+# expected size before they start. When the folders are near WORKSPACE_QUOTA_GB,
+# or the disk is near WORKSPACE_MIN_FREE_GB of free space, the reservation waits
+# for space instead of letting the write fail with ENOSPC. Space frees up as other
+# workers finish and media is deleted. If no space appears within
+# WORKSPACE_WAIT_SECONDS, WorkspaceFull is raised and the caller defers the job to
+# the next run. Media, captions and the PCM decode of a job are deleted as soon as
+# its transcript is in the transcript store (WORKSPACE_EAGER_CLEANUP, on by default).
+# A reservation can say where its holder writes (written_bytes); the bytes already
+# on disk there count as used, so only the rest of the reservation is still held.
+
+WORKSPACE_DIRS = ["download", "transcribe"]
+WORKSPACE_QUOTA_BYTES = int(float(os.environ.get('WORKSPACE_QUOTA_GB', 20)) * 1024 ** 3)
+WORKSPACE_MIN_FREE_BYTES = int(float(os.environ.get('WORKSPACE_MIN_FREE_GB', 1)) * 1024 ** 3)
+WORKSPACE_WAIT_SECONDS = float(os.environ.get('WORKSPACE_WAIT_SECONDS', 300))
+WORKSPACE_EAGER_CLEANUP = os.environ.get('WORKSPACE_EAGER_CLEANUP', 'true').lower() in ('1', 'true')
+POLL_SECONDS = 2
+
+# Size guesses for reservations when the real size is not known yet.
+MEDIA_BYTES_PER_SECOND_ESTIMATE = 200_000  # yt-dlp 'best[ext=mp4]' video
+DEFAULT_MEDIA_BYTES_ESTIMATE = 100 * 1024 * 1024
+
+MEDIA_ARTIFACTS = ('media', 'captions')
+
+
+class WorkspaceFull(Exception):
+    """No room for a reservation within the wait time."""
+
+
+def is_disk_full_error(error):
+    return (isinstance(error, OSError) and error.errno == errno.ENOSPC) or 'No space left on device' in str(error)
+
+def estimate_media_bytes(file_size=None, duration_seconds=None):
+    if file_size:
+        return int(file_size)
+    if duration_seconds:
+        return int(duration_seconds * MEDIA_BYTES_PER_SECOND_ESTIMATE)
+    return DEFAULT_MEDIA_BYTES_ESTIMATE
+
+def _directory_bytes(directory):
+    total = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass  # Removed while walking
+    return total
+
+def files_bytes(paths):
+    """Total size of the paths that exist."""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass  # Not written yet, or already moved
+    return total
+
+
+class Workspace:
+    """Tracks bytes used under the working folders and hands out reservations against the quota."""
+
+    def __init__(self, directories=None, quota_bytes=WORKSPACE_QUOTA_BYTES, min_free_bytes=WORKSPACE_MIN_FREE_BYTES):
+        self.directories = directories or WORKSPACE_DIRS
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self._condition = threading.Condition()
+        self._reservations = {}  # token -> (expected_bytes, written_bytes)
+
+    def usage_bytes(self):
+        return sum(_directory_bytes(directory) for directory in self.directories if os.path.exists(directory))
+
+    def reserved_bytes(self):
+        """Bytes held by open reservations, minus what their holders have already written (counted in usage_bytes)."""
+        return sum(
+            max(0, expected_bytes - (written_bytes() if written_bytes else 0))
+            for expected_bytes, written_bytes in self._reservations.values()
+        )
+
+    def available_bytes(self):
+        """Bytes that can still be written, after the quota, the free-space floor and open reservations."""
+        used_bytes = self.usage_bytes()
+        set_gauge('workspace_bytes', used_bytes, help="Bytes used under the working folders.")
+        disk_path = next((directory for directory in self.directories if os.path.exists(directory)), '.')
+        free_bytes = shutil.disk_usage(disk_path).free
+        return min(self.quota_bytes - used_bytes, free_bytes - self.min_free_bytes) - self.reserved_bytes()
+
+    @contextmanager
+    def reserve(self, expected_bytes, label=None, timeout=WORKSPACE_WAIT_SECONDS, written_bytes=None):
+        """
+        Block until expected_bytes fit, hold them for the with-block, then release the reservation.
+        written_bytes, if given, returns how many of those bytes the holder has written so far.
+        """
+        wait_start = time.perf_counter()
+        waited = False
+        with self._condition:
+            while self.available_bytes() < expected_bytes:
+                # A job bigger than the whole budget still runs once nothing else holds a reservation.
+                if not self._reservations and expected_bytes > self.quota_bytes and self.available_bytes() > 0:
+                    break
+                remaining = timeout - (time.perf_counter() - wait_start)
+                if remaining <= 0:
+                    inc('workspace_reservations_total', help="Workspace reservations.", result='full')
+                    raise WorkspaceFull(f"No room for {expected_bytes / 1024 ** 2:.0f} MB ({label}) within {timeout:.0f}s; "
+                                        f"quota {self.quota_bytes / 1024 ** 3:.1f} GB")
+                if not waited:
+                    logging.info(f"Workspace near its quota; waiting for space for {label} ({expected_bytes / 1024 ** 2:.0f} MB)")
+                    waited = True
+                # Wake on in-process releases, and poll for deletions by other processes.
+                self._condition.wait(min(POLL_SECONDS, remaining))
+            token = object()
+            self._reservations[token] = (expected_bytes, written_bytes)
+        observe('workspace_wait_seconds', time.perf_counter() - wait_start, help="Time spent waiting for workspace space.")
+        inc('workspace_reservations_total', help="Workspace reservations.", result='waited' if waited else 'immediate')
+        try:
+            yield
+        finally:
+            with self._condition:
+                del self._reservations[token]
+                self._condition.notify_all()
+
+    def notify_freed(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+workspace = Workspace()
+
+def reserve(expected_bytes, label=None, timeout=WORKSPACE_WAIT_SECONDS, written_bytes=None):
+    return workspace.reserve(expected_bytes, label, timeout, written_bytes)
+
+def release_media(pk_id, extra_artifacts=None):
+    """
+    Delete a job's media and captions (plus extra_artifacts, {kind: path}, e.g. its PCM decode) once its
+    transcript is stored durably. Records the freed bytes per artifact in the manifest and returns the total.
+    """
+    if not WORKSPACE_EAGER_CLEANUP:
+        return 0
+    manifest = load_manifest(pk_id) or {'artifacts': {}}
+    targets = {kind: manifest['artifacts'].get(kind) for kind in MEDIA_ARTIFACTS}
+    targets.update(extra_artifacts or {})
+
+    freed_by_artifact = {}
+    for kind, path in targets.items():
+        if not path or not os.path.exists(path):
+            continue
+        size = os.path.getsize(path)
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.warning(f"Could not delete {path}: {e}")
+            continue
+        freed_by_artifact[kind] = size
+
+    freed_bytes = sum(freed_by_artifact.values())
+    if freed_by_artifact:
+        update_manifest(
+            pk_id,
+            artifacts={kind: None for kind in MEDIA_ARTIFACTS if kind in freed_by_artifact},
+            artifact_bytes_freed={**manifest.get('artifact_bytes_freed', {}), **freed_by_artifact},
+        )
+        inc('workspace_bytes_freed_total', freed_bytes, help="Bytes deleted by eager workspace cleanup.")
+        workspace.notify_freed()
+        print(f"Freed {freed_bytes / 1024 ** 2:.1f} MB of media for pk_id {pk_id}")
+    return freed_bytes
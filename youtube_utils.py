@@ -1,7 +1,28 @@
+import os
 import re
+import json
+import time
 import logging
+import threading
 from urllib.parse import urlparse, parse_qs
 
+YOUTUBE_HOSTS = ['www.youtube.com', 'youtube.com', 'm.youtube.com', 'music.youtube.com', 'www.youtube-nocookie.com']
+VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{11}$')
+VIDEO_PATH_PREFIXES = ['/shorts/', '/embed/', '/v/', '/live/']
+CHANNEL_PATH_PATTERN = re.compile(r'^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)(/(videos|shorts|streams))?/?$')
+
+# Flat playlist/channel listings and per-video metadata (title, duration) from yt-dlp
+# are cached here across runs, so re-submitted collections and their child videos
+# don't repeat the extraction. Whether a video had captions is cached too, for the
+# run planner (plan_run.py).
+YOUTUBE_METADATA_CACHE_PATH = os.path.join("cache", "youtube_metadata.json")
+COLLECTION_CACHE_TTL_SECONDS = 6 * 3600  # Playlists and channels gain videos, so expire listings sooner
+VIDEO_CACHE_TTL_SECONDS = 7 * 24 * 3600
+CAPTIONS_CACHE_TTL_SECONDS = 7 * 24 * 3600
+MAX_COLLECTION_VIDEOS = 500
+
+_cache_lock = threading.Lock()
+
 def extract_video_id(youtube_url):
     """This function extracts the video ID from a YouTube URL."""
     # Parse the URL into components
@@ -12,10 +33,40 @@ def extract_video_id(youtube_url):
         # If URL is in the format http://youtu.be/<video_id>
         if parsed_url.hostname in ['youtu.be']:
             video_id = parsed_url.path[1:]  # Strip leading slash
+        # Shorts, embeds and live links carry the ID in the path: /shorts/<video_id>
+        elif parsed_url.hostname in YOUTUBE_HOSTS and any(parsed_url.path.startswith(prefix) for prefix in VIDEO_PATH_PREFIXES):
+            video_id = parsed_url.path.split('/')[2]
         else:
             raise ValueError("Unable to extract Video ID from YouTube URL")
     return video_id[0] if isinstance(video_id, list) else video_id
 
+def get_video_id(youtube_url):
+    """Video ID of a single-video YouTube URL, or None."""
+    try:
+        video_id = extract_video_id(youtube_url)
+    except ValueError:
+        return None
+    return video_id if video_id and VIDEO_ID_PATTERN.match(video_id) else None
+
+def classify_youtube_url(youtube_url):
+    """
+    Return ('video', video_id), ('playlist', list_id), ('channel', channel_path) or (None, None).
+    A watch URL that also carries a list= parameter is treated as the single video; without a v= parameter
+    (watch?list=...) it is the playlist.
+    """
+    parsed_url = urlparse(youtube_url)
+    video_id = get_video_id(youtube_url) if parsed_url.hostname in YOUTUBE_HOSTS + ['youtu.be'] else None
+    if video_id:
+        return 'video', video_id
+    if parsed_url.hostname not in YOUTUBE_HOSTS:
+        return None, None
+    if parsed_url.path.rstrip('/') in ('/playlist', '/watch') and parse_qs(parsed_url.query).get('list'):
+        return 'playlist', parse_qs(parsed_url.query)['list'][0]
+    channel_match = CHANNEL_PATH_PATTERN.match(parsed_url.path)
+    if channel_match:
+        return 'channel', channel_match.group(1)
+    return None, None
+
 def validate_youtube_url(youtube_url):
     logging.info(f'Validating YouTube URL: {youtube_url}')  # New logging line
     try:
@@ -30,11 +81,106 @@ def validate_youtube_url(youtube_url):
 
 def is_valid_youtube_url(youtube_url):
     logging.info(f'Checking if URL is valid: {youtube_url}')  # New logging line
-    parsed_url = urlparse(youtube_url)
-    if parsed_url.hostname not in ['www.youtube.com', 'youtube.com', 'youtu.be']:
-        return False
-    if parsed_url.hostname == 'youtu.be' and not parsed_url.path:
-        return False
-    if parsed_url.hostname in ['www.youtube.com', 'youtube.com'] and not parse_qs(parsed_url.query).get("v"):
-        return False
-    return True
\ No newline at end of file
+    return classify_youtube_url(youtube_url)[0] == 'video'
+
+def is_youtube_collection_url(youtube_url):
+    """True for playlist and channel URLs, which are expanded into one job per video."""
+    return classify_youtube_url(youtube_url)[0] in ('playlist', 'channel')
+
+def _load_cache():
+    try:
+        with open(YOUTUBE_METADATA_CACHE_PATH, 'r', encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        return {'collections': {}, 'videos': {}, 'captions': {}}
+
+def _save_cache(cache):
+    os.makedirs(os.path.dirname(YOUTUBE_METADATA_CACHE_PATH), exist_ok=True)
+    temp_path = f"{YOUTUBE_METADATA_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(temp_path, YOUTUBE_METADATA_CACHE_PATH)
+
+def get_cached_video_metadata(video_id):
+    """Cached {'title', 'duration'} for a video (from an earlier flat extraction), or None."""
+    with _cache_lock:
+        entry = _load_cache()['videos'].get(video_id)
+    if entry and time.time() - entry['fetched_at'] < VIDEO_CACHE_TTL_SECONDS:
+        return entry
+    return None
+
+def get_cached_caption_availability(video_id):
+    """True/False if a recent download found captions for the video or not, None if unknown."""
+    with _cache_lock:
+        entry = _load_cache().get('captions', {}).get(video_id)
+    if entry and time.time() - entry['checked_at'] < CAPTIONS_CACHE_TTL_SECONDS:
+        return entry['available']
+    return None
+
+def record_caption_availability(video_id, available):
+    with _cache_lock:
+        cache = _load_cache()
+        cache.setdefault('captions', {})[video_id] = {'available': bool(available), 'checked_at': time.time()}
+        _save_cache(cache)
+
+def _collection_listing_url(youtube_url):
+    # A bare channel URL lists its tabs; ask for the uploads tab directly.
+    kind, collection_id = classify_youtube_url(youtube_url)
+    if kind == 'channel' and not re.search(r'/(videos|shorts|streams)/?$', urlparse(youtube_url).path):
+        return f"https://www.youtube.com/{collection_id}/videos"
+    # watch?list= and /playlist?list= links to one playlist share a listing.
+    if kind == 'playlist':
+        return f"https://www.youtube.com/playlist?list={collection_id}"
+    return youtube_url
+
+def get_cached_collection(youtube_url):
+    """Cached listing entries of a playlist or channel URL, or None when it was not listed recently."""
+    with _cache_lock:
+        cached = _load_cache()['collections'].get(_collection_listing_url(youtube_url))
+    if cached and time.time() - cached['fetched_at'] < COLLECTION_CACHE_TTL_SECONDS:
+        return cached['entries']
+    return None
+
+def expand_youtube_collection(youtube_url, max_videos=MAX_COLLECTION_VIDEOS):
+    """
+    List the videos of a playlist or channel URL with yt-dlp flat extraction (no per-video requests).
+    Returns dicts with video_id, url, title and duration (seconds or None), using the cache when fresh.
+    """
+    listing_url = _collection_listing_url(youtube_url)
+    cached_entries = get_cached_collection(youtube_url)
+    if cached_entries is not None:
+        logging.info(f"Using cached listing of {listing_url} ({len(cached_entries)} videos)")
+        return cached_entries
+
+    import yt_dlp as youtube_dl
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'playlistend': max_videos,
+    }
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(listing_url, download=False)
+
+    entries = []
+    for entry in info_dict.get('entries') or []:
+        video_id = entry.get('id')
+        if not video_id or not VIDEO_ID_PATTERN.match(video_id):
+            continue  # Nested tabs or playlists, not videos
+        entries.append({
+            'video_id': video_id,
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'title': entry.get('title'),
+            'duration': entry.get('duration'),
+        })
+
+    now = time.time()
+    with _cache_lock:
+        cache = _load_cache()
+        cache['collections'][listing_url] = {'fetched_at': now, 'title': info_dict.get('title'), 'entries': entries}
+        for entry in entries:
+            if entry['title']:
+                cache['videos'][entry['video_id']] = {'title': entry['title'], 'duration': entry['duration'], 'fetched_at': now}
+        _save_cache(cache)
+    logging.info(f"Expanded {listing_url} into {len(entries)} videos")
+    return entries